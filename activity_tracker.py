@@ -0,0 +1,89 @@
+"""Buffered last-active / days-active tracking.
+
+Page views only record "user X was seen at T" in memory. A background
+thread writes everything seen since the last flush in one batched UPDATE,
+so each user costs at most one write per flush interval and read-only
+pages never take SQLite's writer lock.
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, or_
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._app = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self._app = app
+        self.flush_interval = app.config.get('ACTIVITY_FLUSH_SECONDS', self.flush_interval)
+        atexit.register(self.flush)
+
+    def touch(self, user_id, when=None):
+        """Record that the user was active; written on the next flush"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            if when > self._pending.get(user_id, datetime.min):
+                self._pending[user_id] = when
+        self._ensure_worker()
+
+    def flush(self):
+        """Write every buffered timestamp in one batched UPDATE"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self._app is None:
+            return 0
+
+        table = User.__table__
+        seen = bindparam('seen')
+        earlier_day = or_(table.c.last_active.is_(None), func.date(table.c.last_active) < func.date(seen))
+        stmt = table.update().where(
+            table.c.id == bindparam('user_id'),
+            or_(table.c.last_active.is_(None), table.c.last_active < seen)
+        ).values(
+            days_active=func.coalesce(table.c.days_active, 0) + case((earlier_day, 1), else_=0),
+            last_active=seen
+        )
+
+        with self._app.app_context():
+            try:
+                db.session.execute(stmt, [{'user_id': user_id, 'seen': when} for user_id, when in pending.items()])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Failed to flush activity for %d users', len(pending))
+                # Keep the timestamps for the next attempt unless newer ones arrived
+                with self._lock:
+                    for user_id, when in pending.items():
+                        self._pending.setdefault(user_id, when)
+                return 0
+            finally:
+                db.session.remove()
+        return len(pending)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-tracker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._wakeup.wait(self.flush_interval):
+            self.flush()
+
+
+activity_tracker = ActivityTracker()
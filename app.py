@@ -1,35 +1,160 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
-from models import db, User, QuizResult, Coins, ShapeResult, MathResult 
+from flask import Blueprint, Flask, Response, current_app, stream_with_context, render_template, request, redirect, url_for, session, jsonify, flash
+from werkzeug.local import LocalProxy
+from models import db, User, QuizResult, Coins, ShapeResult, MathResult, DailyActivity, ActivityTotals, ShapeGameState, award_coins, record_activity, rebuild_rollups, load_weekly_rollups, load_activity_totals
 import random
 from datetime import datetime, timedelta
 import json
 from flask_cors import CORS
-from flask_migrate import Migrate
-import sqlite3
-
-# After creating your Flask app and db
-app = Flask(__name__)
-CORS(app)
-migrate = Migrate(app, db)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = 'super_secret_key_change_this'
-
-db.init_app(app)
+from flask_migrate import Migrate, stamp
+from database import unit_of_work, init_database, init_commit_counter
+from activity_tracker import activity_tracker
+from cache import init_cache, get_user_profile, get_balance
+from batch_events import EventBatch
+from passwords import password_hasher, HasherBusy
+from availability import availability
+from live_updates import live_updates, TooManySubscribers
+from game_state import create_game_state_store, create_quiz_attempt_store
+from content import ContentStore
+from observability import configure_logging, init_metrics, metrics
+from profiling import init_profiling
+from assets import init_assets, build_assets
+from page_cache import page_cache, init_page_cache, render_page
+from exports import EXPORTS, export_query, csv_chunks, ndjson_chunks, gzip_chunks
+import click
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('main', __name__, cli_group=None)
+migrate = Migrate(db=db, render_as_batch=True)
+
+# Per-app services, created by create_app() and looked up on each use
+content = LocalProxy(lambda: current_app.extensions['content'])
+quiz_attempts = LocalProxy(lambda: current_app.extensions['quiz_attempts'])
+game_states = LocalProxy(lambda: current_app.extensions['game_states'])
+
+
+def create_app(config=None):
+    """Build the app. Nothing here touches the database or reads content;
+    the schema comes from `flask db upgrade` (or `flask init-db`) and
+    content packs load on first use.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'super_secret_key_change_this'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['CONTENT_DIR'] = os.path.join(app.root_path, 'content')
+    app.config['CONTENT_RELOAD_SECONDS'] = 5
+    app.config['SHAPE_PASS_SCORE'] = 0  # minimum similarity (0-100) that earns coins
+    app.config['EVENT_BATCH_LIMIT'] = 100  # most events accepted by /api/events/batch at once
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # 0: hash inline
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+    app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'text')  # or 'json'
+    app.config['ADMIN_USER_IDS'] = ()  # users allowed to see /metrics and /admin/profiles
+    app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')  # or send "Authorization: Bearer <token>"
+    app.config.update(config or {})
+
+    configure_logging(app)
+    CORS(app)
+    init_database(app)  # DATABASE_URL, pool sizing and SQLite pragmas
+    init_profiling(app)  # opt-in per-request profiles; first, so they wrap every other hook
+    init_metrics(app)   # per-route latency, SQL counts, slow queries
+    migrate.init_app(app)
+    init_commit_counter(app)
+    activity_tracker.init_app(app)
+    init_cache(app)
+    password_hasher.init_app(app)
+    availability.init_app(app)
+    live_updates.init_app(app)
+    metrics.add_collector('password_hash', password_hasher.metrics)
+    metrics.add_collector('availability', lambda: availability.stats)
+    metrics.add_collector('live_updates', live_updates.metrics)
+    metrics.add_collector('page_cache', page_cache.metrics)
+
+    # Quiz questions, shape tasks, careers and colors, reloaded when the files change
+    app.extensions['content'] = ContentStore(app.config['CONTENT_DIR'], app.config['CONTENT_RELOAD_SECONDS'])
+    # Ungraded quiz attempts, keyed by the short id kept in the session cookie
+    app.extensions['quiz_attempts'] = create_quiz_attempt_store(app)
+    # Shape builder progress per user (current task, completed tasks)
+    app.extensions['game_states'] = create_game_state_store(app)
+    # Hashed, precompressed static files once `flask build-assets` has run
+    init_assets(app)
+    # Pre-rendered activity pages and compiled-template cache
+    init_page_cache(app)
+
+    app.register_blueprint(bp)
+    return app
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create any missing tables and mark the database as migrated"""
+    db.create_all()
+    stamp()
+    click.echo("Database tables created")
+
+@bp.cli.command('build-assets')
+@click.option('--clean', is_flag=True, help='Delete earlier builds first')
+def build_assets_command(clean):
+    """Fingerprint and precompress static files and inline template assets"""
+    manifest = build_assets(current_app.static_folder,
+                            os.path.join(current_app.root_path, current_app.template_folder), clean)
+    compressed = sum(bool(entry['encodings']) for entry in manifest.values())
+    click.echo(f"Built {len(manifest)} assets ({compressed} precompressed) into static/dist")
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Backfill the activity rollup tables from existing results"""
+    users_rebuilt = rebuild_rollups()
+    click.echo(f"Rebuilt activity rollups for {users_rebuilt} users")
+
+def hot_queries(user_id=1):
+    """The per-user queries behind the busiest routes, keyed by route"""
+    today = datetime.utcnow().date()
+    return {
+        'login': User.query.filter_by(phone='0000000000'),
+        'signin': User.query.filter_by(email='nobody@example.com'),
+        'dashboard': Coins.query.filter_by(user_id=user_id),
+        'quiz_result': QuizResult.query.filter_by(user_id=user_id)
+            .order_by(QuizResult.date_taken.desc(), QuizResult.id.desc()).limit(1),
+        'progress (totals)': ActivityTotals.query.filter_by(user_id=user_id),
+        'progress (week)': DailyActivity.query.filter(
+            DailyActivity.user_id == user_id,
+            DailyActivity.day.between(today - timedelta(days=6), today)),
+        'bootstrap (game state)': ShapeGameState.query.filter_by(user_id=user_id),
+        **{f'export ({kind})': export_query(kind, user_id) for kind in EXPORTS},
+    }
 
-# Create tables if they don't exist
-with app.app_context():
-    try:
-        db.create_all()
-        print("Database tables created successfully")
-    except Exception as e:
-        print(f"Error creating tables: {e}")
+def query_plans():
+    """SQLite's EXPLAIN QUERY PLAN steps for each hot query, keyed by route"""
+    plans = {}
+    connection = db.session.connection()
+    for route, query in hot_queries().items():
+        compiled = query.statement.compile(connection)
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        plans[route] = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+    return plans
+
+def uses_index(plan):
+    """True if every table access in plan is an index lookup rather than a scan"""
+    return all('USING' in step and not step.startswith('SCAN') for step in plan if step.startswith(('SCAN', 'SEARCH')))
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot route query needs a full table scan (SQLite only)"""
+    failures = 0
+    for route, plan in query_plans().items():
+        ok = uses_index(plan)
+        if not ok:
+            failures += 1
+        click.echo(f"{'ok  ' if ok else 'SCAN'} {route}: {' | '.join(plan)}")
+    if failures:
+        raise SystemExit(f"{failures} hot queries do not use an index")
 
 # ---------------- HELPER FUNCTIONS ----------------
 def ensure_user_data():
     """Ensure the user has all required data in session"""
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
+        user = get_user_profile(session['user_id'])
         if user:
             # Ensure avatar data is set
             if 'avatar_color' not in session or not session['avatar_color']:
@@ -48,12 +173,32 @@ def ensure_user_data():
             return True
     return False
 
-@app.route('/')
+def activity_stats(user_id, balance=None):
+    """Balance and activity counts the game pages show; pass balance when a write just returned it"""
+    totals = load_activity_totals(user_id)
+    return {
+        "coins": get_balance(user_id) if balance is None else balance,
+        "quiz_attempts": totals.quiz_attempts,
+        "math_attempts": totals.math_attempts,
+        "completed_tasks": totals.shape_attempts,
+        "total_tasks": len(content.current().shape_tasks),
+    }
+
+def is_admin():
+    """Logged in as one of ADMIN_USER_IDS, or presenting ADMIN_TOKEN (for scrapers)"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return True
+    return session.get('user_id') in current_app.config['ADMIN_USER_IDS']
+
+@bp.route('/')
 def home():
-    return render_template('home.html')
+    return render_page('home.html')
 
 # ---------------- AUTH ----------------
-@app.route('/login', methods=['GET', 'POST'])
+BUSY_MESSAGE = 'Lots of friends are logging in right now. Please try again in a moment.'
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         phone = request.form['phone']
@@ -68,12 +213,21 @@ def login():
         
         if not user:
             # Phone number doesn't exist - redirect with error parameter
-            return redirect(url_for('login', error='phone_not_found', phone=phone))
+            return redirect(url_for('.login', error='phone_not_found', phone=phone))
         
-        # Phone exists, now check password
-        if not user.check_password(password):
+        # Phone exists, now check password (hashed in the worker pool, not on this thread)
+        try:
+            matches, new_hash = password_hasher.verify(user.password_hash, password)
+        except HasherBusy:
+            return render_template('login.html', error=BUSY_MESSAGE), 503
+        if not matches:
             # Password is incorrect - redirect with error parameter
-            return redirect(url_for('login', error='wrong_password', phone=phone))
+            return redirect(url_for('.login', error='wrong_password', phone=phone))
+
+        if new_hash:
+            # Hashed with older settings; store the upgraded hash while we have the password
+            with unit_of_work():
+                user.password_hash = new_hash
 
         # Set ALL required session variables
         session['user_id'] = user.id
@@ -91,54 +245,57 @@ def login():
         else:
             session.permanent = False
         
-        # Update user's last active time
-        user.update_last_active()
+        # Update user's last active time (written in the background)
+        activity_tracker.touch(user.id)
         
-        print(f"User {user.username} logged in successfully. Age: {user.age}")
+        logger.info('User logged in', extra={'user_id': user.id, 'age': user.age})
 
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('.dashboard'))
     
     return render_template('login.html')
 
-@app.route('/api/check-phone-exists', methods=['GET'])
+@bp.route('/api/check-availability', methods=['GET'])
+def check_availability():
+    """Which of ?email= and ?phone= are already registered, e.g. {"email": false}"""
+    result = {field: availability.exists(field, request.args[field])
+              for field in ('email', 'phone') if request.args.get(field)}
+    if not result:
+        return jsonify({'error': 'email or phone parameter required'}), 400
+    response = jsonify(result)
+    # Typing back and forth repeats the same questions; let the browser answer those
+    response.headers['Cache-Control'] = 'private, max-age=10'
+    return response
+
+@bp.route('/api/check-phone-exists', methods=['GET'])
 def check_phone_exists():
     """Check if phone number exists in database (for login page)"""
     phone = request.args.get('phone')
     if not phone:
         return jsonify({'error': 'Phone parameter required'}), 400
-    
-    # Clean phone number
-    clean_phone = ''.join(filter(str.isdigit, phone))
-    user = User.query.filter_by(phone=clean_phone).first()
-    
+
+    exists = availability.exists('phone', phone)
     return jsonify({
-        'exists': user is not None,
-        'message': 'Phone number found' if user else 'Phone number not registered'
+        'exists': exists,
+        'message': 'Phone number found' if exists else 'Phone number not registered'
     })
 
-@app.route('/api/check-email', methods=['GET'])
+@bp.route('/api/check-email', methods=['GET'])
 def check_email():
     """Check if email already exists"""
     email = request.args.get('email')
     if not email:
         return jsonify({'error': 'Email parameter required'}), 400
-    
-    user = User.query.filter_by(email=email).first()
-    return jsonify({'exists': user is not None})
+    return jsonify({'exists': availability.exists('email', email)})
 
-@app.route('/api/check-phone', methods=['GET'])
+@bp.route('/api/check-phone', methods=['GET'])
 def check_phone():
     """Check if phone number already exists"""
     phone = request.args.get('phone')
     if not phone:
         return jsonify({'error': 'Phone parameter required'}), 400
-    
-    # Clean phone number (remove any non-digits)
-    clean_phone = ''.join(filter(str.isdigit, phone))
-    user = User.query.filter_by(phone=clean_phone).first()
-    return jsonify({'exists': user is not None})
+    return jsonify({'exists': availability.exists('phone', phone)})
 
-@app.route('/signin', methods=['GET', 'POST'])
+@bp.route('/signin', methods=['GET', 'POST'])
 def signin():
     if request.method == 'POST':
         try:
@@ -188,47 +345,50 @@ def signin():
                 days_active=1,
                 last_active=datetime.utcnow()
             )
-            user.set_password(password)
+            user.password_hash = password_hasher.hash(password)
 
-            db.session.add(user)
-            db.session.commit()
+            with unit_of_work():
+                db.session.add(user)
+                db.session.flush()  # assigns user.id
 
-            # Create coins entry
-            coins = Coins(user_id=user.id, coins=0)
-            db.session.add(coins)
-            db.session.commit()
+                # Create coins entry
+                db.session.add(Coins(user_id=user.id, coins=0))
+            availability.add(email, clean_phone)
             
-            print(f"User {user.username} created successfully with ID: {user.id}")
+            logger.info('User created', extra={'user_id': user.id})
             
             # Flash success message
             flash('Account created successfully! Please login.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
             
+        except HasherBusy:
+            return render_template('signin.html', error=BUSY_MESSAGE), 503
+
         except KeyError as e:
             db.session.rollback()
-            print(f"Missing form field: {e}")
+            logger.warning('Sign-up form missing field %s', e)
             return render_template('signin.html', error='Please fill in all required fields.')
             
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            print(f"Error creating user: {e}")
+            logger.exception('Error creating user')
             return render_template('signin.html', error='Error creating account. Please try again.')
 
     return render_template('signin.html')
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('home'))
+    return redirect(url_for('.home'))
 
-@app.route('/clear-session')
+@bp.route('/clear-session')
 def clear_session():
     """Clear session for testing"""
     session.clear()
     return "Session cleared. <a href='/'>Go home</a>"
 
-@app.route('/test-db')
+@bp.route('/test-db')
 def test_db():
     """Test database connection and user data"""
     users = User.query.all()
@@ -249,19 +409,18 @@ ACTIVITIES = [
     {"name": "Color Carnival", "desc": "Spin the wheel & win coins", "url": "/colour_carnival"},
 ]
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
-        print("No user_id in session, redirecting to login")
         return render_template('kids_dashboard.html', logged_in=False)
 
-    user = User.query.get(session['user_id'])
+    user = get_user_profile(session['user_id'])
     
     # If user not found, clear session and redirect to login
     if not user:
         session.clear()
-        print("User not found in database, clearing session")
-        return redirect(url_for('login'))
+        logger.info('Session user no longer exists, clearing session')
+        return redirect(url_for('.login'))
     
     # Ensure session has all required data
     if 'age' not in session:
@@ -275,18 +434,14 @@ def dashboard():
     if 'avatar_icon' not in session:
         session['avatar_icon'] = user.avatar_icon or 'fa-user'
     
-    # Get coins with error handling
-    coins_obj = Coins.query.filter_by(user_id=user.id).first()
-    coins = coins_obj.coins if coins_obj else 0
+    # Get coins (cached, so the page's follow-up XHRs don't re-read it)
+    coins = get_balance(user.id)
     
-    # Update user's last active
-    user.update_last_active()
-
-    print(f"Showing dashboard for user: {user.username}, Age: {user.age}, Coins: {coins}")
+    # Update user's last active (buffered, so this page view stays read-only)
+    activity_tracker.touch(user.id)
 
     # Determine which dashboard to show based on age
     if session.get('age') == '1-4':
-        print("Showing kids dashboard")
         return render_template(
             'kids_dashboard.html',
             username=session.get('username', 'User'),
@@ -295,7 +450,6 @@ def dashboard():
             logged_in=True
         )
     else:
-        print("Showing junior dashboard")
         return render_template(
             'junior_dashboard.html',
             username=session.get('username', 'User'),
@@ -306,201 +460,146 @@ def dashboard():
         )
 
 # ---------------- ACTIVITIES PAGE ----------------
-@app.route('/activities')
+@bp.route('/activities')
 def activities():
     """Activities page showing all available activities"""
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('activities.html', activities=ACTIVITIES)
+        return redirect(url_for('.login'))
+    return render_page('activities.html', activities=ACTIVITIES)
 
 
-@app.route('/alphabet')
+@bp.route('/alphabet')
 def alphabet():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('alphabet.html')
+        return redirect(url_for('.login'))
+    return render_page('alphabet.html')
 
 
-@app.route('/numbers')
+@bp.route('/numbers')
 def numbers():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('numbers.html')
+        return redirect(url_for('.login'))
+    return render_page('numbers.html')
 
 
-@app.route('/drawing')
+@bp.route('/drawing')
 def drawing():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('drawing.html')
+        return redirect(url_for('.login'))
+    return render_page('drawing.html')
 
 
-@app.route('/math')
+@bp.route('/math')
 def math():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('math.html')
+        return redirect(url_for('.login'))
+    return render_page('math.html')
 
 
-@app.route('/careers')
+@bp.route('/careers')
 def careers():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    # Sample careers data
-    careers = [
-        {"name": "Doctor", "desc": "Helps people when they are sick"},
-        {"name": "Teacher", "desc": "Teaches children in school"},
-        {"name": "Firefighter", "desc": "Puts out fires and saves people"},
-        {"name": "Police Officer", "desc": "Keeps everyone safe"},
-        {"name": "Chef", "desc": "Cooks delicious food"},
-        {"name": "Astronaut", "desc": "Travels to space"},
-        {"name": "Artist", "desc": "Creates beautiful paintings"},
-        {"name": "Scientist", "desc": "Discovers new things"}
-    ]
-    return render_template('career_explorer.html', careers=careers)
-
-
-# ---------------- QUIZ DATA ----------------
-
-QUIZ_QUESTIONS = [
-    # Numeric (5 questions)
-    {"question": "5 + 3 = ?", "answer": "8", "category": "numeric"},
-    {"question": "10 - 4 = ?", "answer": "6", "category": "numeric"},
-    {"question": "What is 2 + 2?", "answer": "4", "category": "numeric"},
-    {"question": "How many days are in a week?", "answer": "7", "category": "numeric"},
-    {"question": "What is 10 + 5?", "answer": "15", "category": "numeric"},
-
-    # General (5 questions)
-    {"question": "What animal is known as man's best friend?", "answer": "dog", "category": "general"},
-    {"question": "What do you call a baby dog?", "answer": "puppy", "category": "general"},
-    {"question": "What is the capital of India?", "answer": "delhi", "category": "general"},
-    {"question": "What do cows drink?", "answer": "water", "category": "general"},
-    {"question": "What is the color of snow?", "answer": "white", "category": "general"},
-
-    # Geography (5 questions)
-    {"question": "What color is the sky on a clear day?", "answer": "blue", "category": "geography"},
-    {"question": "What is the color of grass?", "answer": "green", "category": "geography"},
-    {"question": "What color are bananas?", "answer": "yellow", "category": "geography"},
-    {"question": "What is the color of the ocean?", "answer": "blue", "category": "geography"},
-    {"question": "What is the largest continent?", "answer": "asia", "category": "geography"},
-
-    # Science (5 questions)
-    {"question": "How many legs does a spider have?", "answer": "8", "category": "science"},
-    {"question": "How many fingers do you have on one hand?", "answer": "5", "category": "science"},
-    {"question": "What do bees make?", "answer": "honey", "category": "science"},
-    {"question": "How many wheels does a bicycle have?", "answer": "2", "category": "science"},
-    {"question": "What is the opposite of hot?", "answer": "cold", "category": "science"},
-
-    # History (5 questions)
-    {"question": "Who was the first President of India?", "answer": "rajendra prasad", "category": "history"},
-    {"question": "In which year did India gain independence?", "answer": "1947", "category": "history"},
-    {"question": "Who discovered America?", "answer": "christopher columbus", "category": "history"},
-    {"question": "What was the name of the ship that carried the Pilgrims to America?", "answer": "mayflower", "category": "history"},
-    {"question": "Who was the first man to walk on the moon?", "answer": "neil armstrong", "category": "history"},
-
-    # Sports (5 questions)
-    {"question": "How many players are there in a cricket team?", "answer": "11", "category": "sports"},
-    {"question": "What sport is known as the 'king of sports'?", "answer": "football", "category": "sports"},
-    {"question": "In which sport do you use a racket and shuttlecock?", "answer": "badminton", "category": "sports"},
-    {"question": "How many points is a touchdown worth in American football?", "answer": "6", "category": "sports"},
-    {"question": "What is the highest score possible in ten-pin bowling?", "answer": "300", "category": "sports"}
-]
+        return redirect(url_for('.login'))
+    careers = content.current().careers
+    return render_page('career_explorer.html', key=careers, careers=careers)
 
 
 # ---------------- QUIZ ----------------
-@app.route('/quiz', methods=['GET', 'POST'])
+@bp.route('/quiz', methods=['GET', 'POST'])
 def quiz():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     if request.args.get('clear') == '1':
-        session.pop('selected_questions', None)
-        return redirect(url_for('quiz'))
+        session.pop('quiz_attempt', None)
+        return redirect(url_for('.quiz'))
 
     if request.method == 'POST':
+        pack = content.current()
 
         if 'category' in request.form:
             category = request.form['category']
-            questions = [q for q in QUIZ_QUESTIONS if q['category'] == category]
+            questions = pack.questions_by_category.get(category, ())
             selected = random.sample(questions, min(5, len(questions)))
-            session['selected_questions'] = selected
+            question_ids = [q.id for q in selected]
+
+            # Questions and answers stay on the server; the cookie only carries the attempt id
+            with unit_of_work():
+                session['quiz_attempt'] = quiz_attempts.start(session['user_id'], question_ids)
+            session.pop('selected_questions', None)  # left over in older cookies
             return render_template('quiz.html', questions=selected)
 
+        attempt_id = session.pop('quiz_attempt', None)
         score = 0
-        questions = session.get('selected_questions', [])
-
-        for i, q in enumerate(questions):
-            if request.form.get(f"q{i}", "").lower() == q['answer']:
-                score += 1
 
-        db.session.add(QuizResult(
-            user_id=session['user_id'],
-            score=score,
-            date_taken=datetime.now()
-        ))
-        db.session.commit()
+        with unit_of_work():
+            question_ids = quiz_attempts.finish(attempt_id, session['user_id'])
+            if question_ids is None:
+                # Expired or already graded (e.g. the form was resubmitted)
+                return redirect(url_for('.quiz'))
 
-        coins_obj = Coins.query.filter_by(user_id=session['user_id']).first()
-        if not coins_obj:
-            coins_obj = Coins(user_id=session['user_id'], coins=0)
-            db.session.add(coins_obj)
+            for i, question_id in enumerate(question_ids):
+                q = pack.questions_by_id.get(question_id)
+                if q and request.form.get(f"q{i}", "").lower() == q.answer:
+                    score += 1
 
-        coins_obj.coins += score
-        db.session.commit()
+            date_taken = datetime.utcnow()  # same clock as every other result, and as batched quiz events
+            db.session.add(QuizResult(
+                user_id=session['user_id'],
+                score=score,
+                date_taken=date_taken
+            ))
+            record_activity(session['user_id'], 'quiz', coins=score, score=score, when=date_taken)
+            award_coins(session['user_id'], score, 'quiz')
 
-        return redirect(url_for('quiz_result'))
+        return redirect(url_for('.quiz_result'))
 
     return render_template('quiz_category.html')
 
 
-@app.route('/quiz-result')
+@bp.route('/quiz-result')
 def quiz_result():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
         
     last = QuizResult.query.filter_by(user_id=session['user_id']) \
-        .order_by(QuizResult.id.desc()).first()
+        .order_by(QuizResult.date_taken.desc(), QuizResult.id.desc()).first()
 
-    coins = Coins.query.filter_by(user_id=session['user_id']).first()
-    coins_amount = coins.coins if coins else 0
+    coins_amount = get_balance(session['user_id'])
 
     return render_template('quiz_result.html', score=last.score, coins=coins_amount)
 
 
 # ---------------- PROGRESS ----------------
-@app.route('/progress')
+@bp.route('/progress')
 def progress():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     user_id = session['user_id']
 
-    # Fetch all results (removed RhythmResult)
-    quiz_results = QuizResult.query.filter_by(user_id=user_id).all()
-    shape_results = ShapeResult.query.filter_by(user_id=user_id).all()
-    math_results = MathResult.query.filter_by(user_id=user_id).all()
+    # Lifetime totals plus this week's daily rollups (at most 8 rows)
+    totals, week = load_weekly_rollups(user_id)
 
     # Get total coins from Coins table (this is the current balance)
-    coins_obj = Coins.query.filter_by(user_id=user_id).first()
-    total_coins = coins_obj.coins if coins_obj else 0
+    total_coins = get_balance(user_id)
     
     # Calculate coins earned from each activity
-    quiz_total_coins = sum(r.score for r in quiz_results) if quiz_results else 0
-    shape_total_coins = sum(r.coins_awarded for r in shape_results) if shape_results else 0
-    math_total_coins = sum(r.coins_awarded for r in math_results) if math_results else 0
+    quiz_total_coins = totals.quiz_coins
+    shape_total_coins = totals.shape_coins
+    math_total_coins = totals.math_coins
     
     # Calculate total earned all time
     total_earned_coins = quiz_total_coins + shape_total_coins + math_total_coins
 
     # Number of attempts
-    quiz_attempts = len(quiz_results)
-    shape_attempts = len(shape_results)
-    math_attempts = len(math_results)
+    quiz_attempts = totals.quiz_attempts
+    shape_attempts = totals.shape_attempts
+    math_attempts = totals.math_attempts
 
     # Calculate average scores
-    quiz_avg = round(sum(r.score for r in quiz_results) / quiz_attempts, 1) if quiz_attempts else 0
-    shape_avg_similarity = round(sum(r.similarity_score for r in shape_results) / shape_attempts, 1) if shape_attempts else 0
-    math_avg_score = round(sum(r.score for r in math_results) / math_attempts, 1) if math_attempts else 0
+    quiz_avg = round(totals.quiz_score_sum / quiz_attempts, 1) if quiz_attempts else 0
+    shape_avg_similarity = round(totals.shape_score_sum / shape_attempts, 1) if shape_attempts else 0
+    math_avg_score = round(totals.math_score_sum / math_attempts, 1) if math_attempts else 0
     
     # Calculate TOTAL AVERAGE SCORE (all activities combined, normalized to 0-5 scale)
     normalized_scores = []
@@ -528,52 +627,12 @@ def progress():
     else:
         performance_level = "Excellent"
 
-    # Weekly data for the last 7 days
-    today = datetime.now().date()
+    # Weekly data for the current week, one rollup row per day
     days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    start_of_week = today - timedelta(days=today.weekday())
-    
-    coins_per_day = []
-    quiz_coins_per_day = []
-    shape_coins_per_day = []
-    math_coins_per_day = []
-
-    # Calculate coins for each day of the week
-    for i in range(7):
-        day = start_of_week + timedelta(days=i)
-        day_start = datetime.combine(day, datetime.min.time())
-        day_end = datetime.combine(day, datetime.max.time())
-        
-        day_coins = 0
-        day_quiz_coins = 0
-        day_shape_coins = 0
-        day_math_coins = 0
-        
-        # Quiz coins for this day
-        for r in quiz_results:
-            if hasattr(r, 'date_taken') and r.date_taken:
-                if day_start <= r.date_taken <= day_end:
-                    day_coins += r.score
-                    day_quiz_coins += r.score
-        
-        # Shape coins for this day
-        for r in shape_results:
-            if hasattr(r, 'created_at') and r.created_at:
-                if day_start <= r.created_at <= day_end:
-                    day_coins += r.coins_awarded
-                    day_shape_coins += r.coins_awarded
-        
-        # Math coins for this day
-        for r in math_results:
-            if hasattr(r, 'created_at') and r.created_at:
-                if day_start <= r.created_at <= day_end:
-                    day_coins += r.coins_awarded
-                    day_math_coins += r.coins_awarded
-        
-        coins_per_day.append(day_coins)
-        quiz_coins_per_day.append(day_quiz_coins)
-        shape_coins_per_day.append(day_shape_coins)
-        math_coins_per_day.append(day_math_coins)
+    quiz_coins_per_day = [row.quiz_coins for row in week]
+    shape_coins_per_day = [row.shape_coins for row in week]
+    math_coins_per_day = [row.math_coins for row in week]
+    coins_per_day = [row.quiz_coins + row.shape_coins + row.math_coins for row in week]
 
     return render_template('progress.html',
                            total_coins=total_coins,
@@ -595,26 +654,24 @@ def progress():
                            shape_coins_per_day=shape_coins_per_day,
                            math_coins_per_day=math_coins_per_day)  
             
-@app.route('/progress-data')
+@bp.route('/progress-data')
 def progress_data():
     if 'user_id' not in session:
         return {"error": "Not logged in"}, 401
 
-    quiz_results = QuizResult.query.filter_by(user_id=session['user_id']).all()
-    shape_results = ShapeResult.query.filter_by(user_id=session['user_id']).all()
-    math_results = MathResult.query.filter_by(user_id=session['user_id']).all()
+    totals, week = load_weekly_rollups(session['user_id'])
 
-    quiz_attempts = len(quiz_results)
-    quiz_total = sum(r.score for r in quiz_results)
-    quiz_avg = round(quiz_total / quiz_attempts, 2) if quiz_attempts else 0
+    quiz_attempts = totals.quiz_attempts
+    quiz_total = totals.quiz_coins
+    quiz_avg = round(totals.quiz_score_sum / quiz_attempts, 2) if quiz_attempts else 0
 
-    shape_attempts = len(shape_results)
-    shape_total_coins = sum(r.coins_awarded for r in shape_results)
-    shape_avg_similarity = round(sum(r.similarity_score for r in shape_results) / shape_attempts, 2) if shape_attempts else 0
+    shape_attempts = totals.shape_attempts
+    shape_total_coins = totals.shape_coins
+    shape_avg_similarity = round(totals.shape_score_sum / shape_attempts, 2) if shape_attempts else 0
 
-    math_attempts = len(math_results)
-    math_total_coins = sum(r.coins_awarded for r in math_results)
-    math_avg_score = round(sum(r.score for r in math_results) / math_attempts, 1) if math_attempts else 0
+    math_attempts = totals.math_attempts
+    math_total_coins = totals.math_coins
+    math_avg_score = round(totals.math_score_sum / math_attempts, 1) if math_attempts else 0
 
     total_coins = quiz_total + shape_total_coins + math_total_coins
 
@@ -627,17 +684,8 @@ def progress_data():
     else:
         performance_level = "Advanced"
 
-    today = datetime.now().date()
-    start = today - timedelta(days=today.weekday())
     days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    coins_per_day = []
-
-    for i in range(7):
-        day = start + timedelta(days=i)
-        quiz_coins = sum(r.score for r in quiz_results if r.date_taken.date() == day)
-        shape_coins = sum(r.coins_awarded for r in shape_results if r.created_at.date() == day)
-        math_coins = sum(r.coins_awarded for r in math_results if r.created_at.date() == day)
-        coins_per_day.append(quiz_coins + shape_coins + math_coins)
+    coins_per_day = [row.quiz_coins + row.shape_coins + row.math_coins for row in week]
 
     total_avg_score = round((quiz_avg + shape_avg_similarity / 20 + math_avg_score / 2) / 3, 2) if (quiz_attempts or shape_attempts or math_attempts) else 0
 
@@ -662,29 +710,69 @@ def progress_data():
         'coins_per_day': coins_per_day
     }
     
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/api/export/<kind>')
+def export_history(kind):
+    """Stream a child's full quiz, shape, math or coin history as CSV or NDJSON"""
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    export_format = request.args.get('format', 'csv')
+    if kind != 'all' and kind not in EXPORTS:
+        return jsonify({"error": f"Unknown export, choose one of: all, {', '.join(EXPORTS)}"}), 404
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    if kind == 'all' and export_format == 'csv':
+        return jsonify({"error": "all is only available as format=ndjson"}), 400
+
+    # Admins (e.g. exporting for a school) may name the child; everyone else gets their own
+    user_id = session['user_id']
+    if request.args.get('user_id') and is_admin():
+        user_id = request.args.get('user_id', type=int)
+        if user_id is None:
+            return jsonify({"error": "user_id must be a number"}), 400
+
+    if export_format == 'csv':
+        chunks, mimetype = csv_chunks(kind, user_id), 'text/csv'
+    else:
+        chunks, mimetype = ndjson_chunks(list(EXPORTS) if kind == 'all' else [kind], user_id), 'application/x-ndjson'
+    gzipped = bool(request.accept_encodings['gzip'])
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+
+    # stream_with_context keeps the database session open while the rows are streamed
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'attachment; filename="history-{user_id}-{kind}.{export_format}"'
+    response.headers['Cache-Control'] = 'private, no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/profile', methods=['GET', 'POST'])
 def profile():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
-    user = User.query.get(session['user_id'])
+    # The full row, not the cached profile: the form edits it
+    user = db.session.get(User, session['user_id'])
 
     if request.method == 'POST':
         try:
-            # Update basic profile info
-            user.username = request.form['username']
-            user.email = request.form['email']
-            user.phone = request.form['phone']
-            user.age = request.form['age']
-            
-            # Update avatar if provided
-            if 'avatar_color' in request.form:
-                user.avatar_color = request.form['avatar_color']
-            if 'avatar_icon' in request.form:
-                user.avatar_icon = request.form['avatar_icon']
-            
-            db.session.commit()
-            
+            with unit_of_work():
+                # Update basic profile info
+                user.username = request.form['username']
+                user.email = request.form['email']
+                user.phone = request.form['phone']
+                user.age = request.form['age']
+
+                # Update avatar if provided
+                if 'avatar_color' in request.form:
+                    user.avatar_color = request.form['avatar_color']
+                if 'avatar_icon' in request.form:
+                    user.avatar_icon = request.form['avatar_icon']
+            availability.add(user.email, user.phone)
+
             # Update session data
             session['age'] = user.age
             session['username'] = user.username
@@ -692,230 +780,181 @@ def profile():
             session['avatar_icon'] = user.avatar_icon if user.avatar_icon else 'fa-user'
             
             flash('Profile updated successfully!', 'success')
-            return redirect(url_for('profile'))
+            return redirect(url_for('.profile'))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating profile: {str(e)}', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('.profile'))
+
+    # Counts towards days active on the tracker's next flush
+    activity_tracker.touch(user.id)
 
-    if hasattr(user, 'update_days_active'):
-        user.update_days_active()
-    else:
-        # Fallback: Update last_active field
-        user.last_active = datetime.utcnow()
-        db.session.commit()
-    
     return render_template('profile.html', user=user)
 
-# Store user progress and coins
-users = {}
+@bp.cli.command('purge-game-state')
+def purge_game_state_command():
+    """Delete shape builder state and quiz attempts idle longer than the TTL"""
+    click.echo(f"Removed {game_states.purge()} expired game states")
+    click.echo(f"Removed {quiz_attempts.purge()} expired quiz attempts")
 
 # Store active calls (in-memory for now)
 active_calls = {}
 
-# Shape tasks database
-shape_tasks = [
-    {
-        "id": 1,
-        "name": "Ice Cream",
-        "description": "Build an ice cream cone",
-        "shapes": [
-            {"type": "triangle", "color": "#FFD700", "position": "50% 20%", "size": "100px"},
-            {"type": "circle", "color": "#FFB6C1", "position": "50% 5%", "size": "60px"}
-        ],
-        "validation_rules": {
-            "min_shapes": 2,
-            "required_shapes": ["triangle", "circle"],
-            "position_tolerance": 50
-        }
-    },
-    {
-        "id": 2,
-        "name": "Sun",
-        "description": "Build a sunny day scene",
-        "shapes": [
-            {"type": "circle", "color": "#FFD700", "position": "50% 50%", "size": "80px"},
-            {"type": "triangle", "color": "#FFA500", "position": "50% 20%", "size": "40px", "rotation": "0deg"}
-        ],
-        "validation_rules": {
-            "min_shapes": 2,
-            "required_shapes": ["circle"],
-            "position_tolerance": 25
-        }
-    },
-    {
-        "id": 3,
-        "name": "House",
-        "description": "Build a simple house",
-        "shapes": [
-            {"type": "square", "color": "#8B4513", "position": "50% 60%", "size": "100px"},
-            {"type": "triangle", "color": "#B22222", "position": "50% 40%", "size": "120px"}
-        ],
-        "validation_rules": {
-            "min_shapes": 2,
-            "required_shapes": ["square", "triangle"],
-            "position_tolerance": 30
-        }
-    },
-    {
-        "id": 4,
-        "name": "Tree",
-        "description": "Build a green tree",
-        "shapes": [
-            {"type": "triangle", "color": "#228B22", "position": "50% 30%", "size": "100px"},
-            {"type": "rectangle", "color": "#8B4513", "position": "50% 60%", "size": "30px 60px"}
-        ],
-        "validation_rules": {
-            "min_shapes": 2,
-            "required_shapes": ["triangle", "rectangle"],
-            "position_tolerance": 25
-        }
-    }
-]
 
-
-@app.route('/shape_builder')
+@bp.route('/shape_builder')
 def shape_builder():
     """Shape builder game page"""
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template('shape_builder.html')
 
-@app.route('/api/get_task', methods=['GET'])
+@bp.route('/api/get_task', methods=['GET'])
 def get_task():
     """Get a random shape task"""
     if 'user_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
 
     user_id = session['user_id']
-
-    # Initialize user data if not exists
-    if user_id not in users:
-        users[user_id] = {
-            "coins": 0,
-            "completed_tasks": [],
-            "current_task": None
-        }
+    pack = content.current()
+    state = game_states.get(user_id)
 
     # Get a task that hasn't been completed
-    available_tasks = [task for task in shape_tasks if task['id'] not in users[user_id]['completed_tasks']]
+    task_id = pack.pick_task_id(state['completed_tasks'])
 
-    if not available_tasks:
+    if task_id is None:
         # Reset if all tasks completed
-        users[user_id]['completed_tasks'] = []
-        available_tasks = shape_tasks
+        state['completed_tasks'] = []
+        task_id = random.choice(pack.task_ids)
 
-    task = random.choice(available_tasks)
-    users[user_id]['current_task'] = task['id']
+    state['current_task'] = task_id
+    with unit_of_work():
+        game_states.save(user_id, state)
 
     # Send only necessary info to client
-    task_info = {
-        "id": task["id"],
-        "name": task["name"],
-        "description": task["description"],
-        "target_shapes": task["shapes"]
-    }
+    return jsonify(pack.tasks_by_id[task_id].to_client())
 
-    return jsonify(task_info)
-
-@app.route('/api/validate_shape', methods=['POST'])
+@bp.route('/api/validate_shape', methods=['POST'])
 def validate_shape():
     """Validate user's shape against the task"""
     if 'user_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
 
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
     user_id = session['user_id']
     user_shapes = data.get('shapes', [])
     task_id = data.get('task_id')
 
     # Find the current task
-    current_task = None
-    for task in shape_tasks:
-        if task['id'] == task_id:
-            current_task = task
-            break
+    pack = content.current()
+    current_task = pack.tasks_by_id.get(task_id)
 
     if not current_task:
         return jsonify({"error": "Task not found"}), 404
+    if not isinstance(user_shapes, list) or not all(isinstance(shape, dict) for shape in user_shapes):
+        return jsonify({"error": "shapes must be a list of shapes"}), 400
 
-    # Get validation rules
-    rules = current_task['validation_rules']
-
-    # Basic validation
-    if len(user_shapes) < rules['min_shapes']:
-        return jsonify({
-            "valid": False,
-            "message": f"Need at least {rules['min_shapes']} shapes"
-        })
-
-    # Check required shape types
-    user_shape_types = [shape['type'] for shape in user_shapes]
-    for required in rules['required_shapes']:
-        if required not in user_shape_types:
-            return jsonify({
-                "valid": False,
-                "message": f"Missing required shape: {required}"
-            })
-
-    # Award coins
-    coins_obj = Coins.query.filter_by(user_id=user_id).first()
-    if not coins_obj:
-        coins_obj = Coins(user_id=user_id, coins=0)
-        db.session.add(coins_obj)
+    # Shape count, required types, then geometric similarity
+    valid, message, similarity_score = pack.grade_shapes(task_id, user_shapes, current_app.config['SHAPE_PASS_SCORE'])
+    if not valid:
+        result = {"valid": False, "message": message}
+        if similarity_score is not None:
+            result["similarity"] = similarity_score
+        return jsonify(result)
 
     coins_awarded = 10
-    coins_obj.coins += coins_awarded
-    
-    # Record shape result
-    shape_result = ShapeResult(
-        user_id=user_id,
-        similarity_score=100,
-        coins_awarded=coins_awarded
-    )
-    db.session.add(shape_result)
-    db.session.commit()
-
-    # Update in-memory storage
-    if user_id not in users:
-        users[user_id] = {
-            "coins": 0,
-            "completed_tasks": [],
-            "current_task": None
-        }
-    users[user_id]['coins'] = coins_obj.coins
-    users[user_id]['completed_tasks'].append(task_id)
+    created_at = datetime.utcnow()
+    state = game_states.get(user_id)
+    state['completed_tasks'].append(task_id)
+    with unit_of_work():
+        # Award coins
+        balance = award_coins(user_id, coins_awarded, 'shape')
+
+        # Record shape result
+        db.session.add(ShapeResult(
+            user_id=user_id,
+            similarity_score=similarity_score,
+            coins_awarded=coins_awarded,
+            created_at=created_at
+        ))
+        record_activity(user_id, 'shape', coins=coins_awarded, score=similarity_score, when=created_at)
+        game_states.save(user_id, state)
 
     return jsonify({
         "valid": True,
-        "message": "Great job! Shape matches!",
-        "coins": coins_obj.coins,
-        "award": coins_awarded
+        "message": message,
+        "coins": balance,
+        "award": coins_awarded,
+        "similarity": similarity_score,
+        "stats": activity_stats(user_id, balance)
     })
 
-@app.route('/api/user_stats', methods=['GET'])
+@bp.route('/api/user_stats', methods=['GET'])
 def user_stats():
     """Get user statistics"""
     if 'user_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
     
-    user_id = session['user_id']
-
-    # Get coins from database
-    coins_obj = Coins.query.filter_by(user_id=user_id).first()
-    coins = coins_obj.coins if coins_obj else 0
+    # Coins (cached) and the lifetime rollup row; no COUNT over the results table
+    return jsonify(activity_stats(session['user_id']))
 
-    # Get completed tasks from database
-    completed_tasks = ShapeResult.query.filter_by(user_id=user_id).count()
+@bp.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    """Everything a game page needs on load, in one revalidatable response"""
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
 
-    return jsonify({
-        "coins": coins,
-        "completed_tasks": completed_tasks,
-        "total_tasks": len(shape_tasks)
+    user_id = session['user_id']
+    pack = content.current()
+    profile = get_user_profile(user_id)
+    state = game_states.get(user_id)
+    current_task = state['current_task']
+    if current_task in state['completed_tasks']:
+        current_task = None  # solved; the page asks /api/get_task for the next one
+
+    response = jsonify({
+        "user": profile and {
+            "username": profile.username,
+            "avatar_color": profile.avatar_color,
+            "avatar_icon": profile.avatar_icon,
+        },
+        "stats": activity_stats(user_id),
+        "current_task": pack.tasks_by_id[current_task].to_client() if current_task in pack.tasks_by_id else None,
+        "live_updates": live_updates.available(request.environ),
     })
+    # Unchanged since the browser's copy (same coins, task and content): answer 304 with no body
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
         
-@app.route('/api/math/complete', methods=['POST'])
+@bp.route('/api/coins/stream', methods=['GET'])
+def coin_stream():
+    """Server-Sent Events: the current balance, then every change as it commits.
+
+    Needs a threaded or gevent worker; see live_updates.
+    """
+    if 'user_id' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    if not live_updates.available(request.environ):
+        # A sync worker would be pinned by this one client; the pages only subscribe when bootstrap says so
+        return jsonify({"error": "Live updates are not available on this server"}), 503
+
+    user_id = session['user_id']
+    try:
+        subscriber = live_updates.subscribe(user_id)
+    except TooManySubscribers:
+        return jsonify({"error": "Too many live connections, try again later"}), 503
+
+    initial = live_updates.message('balance', {'coins': get_balance(user_id)})
+    response = Response(live_updates.stream(subscriber, initial), mimetype='text/event-stream')
+    response.call_on_close(lambda: live_updates.unsubscribe(user_id, subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through as they are written
+    return response
+
+@bp.route('/api/math/complete', methods=['POST'])
 def record_math_result():
     """API endpoint for recording math game completion"""
     if 'user_id' not in session:
@@ -927,27 +966,25 @@ def record_math_result():
         score = data.get('score', 0)
         coins_earned = data.get('coins_earned', 0)
 
-        # Update user's coins
-        coins_obj = Coins.query.filter_by(user_id=session['user_id']).first()
-        if not coins_obj:
-            coins_obj = Coins(user_id=session['user_id'], coins=0)
-            db.session.add(coins_obj)
-
-        coins_obj.coins += coins_earned
-        db.session.commit()
-
-        # Record math result
-        db.session.add(MathResult(
-            user_id=session['user_id'],
-            level_completed=level_completed,
-            score=score,
-            coins_awarded=coins_earned
-        ))
-        db.session.commit()
+        created_at = datetime.utcnow()
+        with unit_of_work():
+            # Update user's coins
+            balance = award_coins(session['user_id'], coins_earned, 'math')
+
+            # Record math result
+            db.session.add(MathResult(
+                user_id=session['user_id'],
+                level_completed=level_completed,
+                score=score,
+                coins_awarded=coins_earned,
+                created_at=created_at
+            ))
+            record_activity(session['user_id'], 'math', coins=coins_earned, score=score, when=created_at)
 
         return jsonify({
             'success': True,
-            'total_coins': coins_obj.coins,
+            'total_coins': balance,
+            'stats': activity_stats(session['user_id'], balance),
             'message': f'Level {level_completed} completed! Earned {coins_earned} coins.'
         })
 
@@ -970,38 +1007,16 @@ def get_time_ago(dt):
     else:
         return "just now"
 
-# List of colors with their names
-COLORS = [
-    {"name": "Red", "code": "#FF0000"},
-    {"name": "Green", "code": "#00FF00"},
-    {"name": "Blue", "code": "#0000FF"},
-    {"name": "Yellow", "code": "#FFFF00"},
-    {"name": "Purple", "code": "#800080"},
-    {"name": "Orange", "code": "#FFA500"},
-    {"name": "Pink", "code": "#FFC0CB"},
-    {"name": "Cyan", "code": "#00FFFF"},
-    {"name": "Magenta", "code": "#FF00FF"},
-    {"name": "Lime", "code": "#00FF00"},
-    {"name": "Brown", "code": "#A52A2A"},
-    {"name": "Teal", "code": "#008080"},
-    {"name": "Navy", "code": "#000080"},
-    {"name": "Gold", "code": "#FFD700"},
-    {"name": "Silver", "code": "#C0C0C0"}
-]
-
-@app.route('/colour_carnival')
+@bp.route('/colour_carnival')
 def colour_carnival():
     """Color Carnival page - spin wheel and learn colors"""
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    # Get user's coins
-    coins_obj = Coins.query.filter_by(user_id=session['user_id']).first()
-    coins = coins_obj.coins if coins_obj else 0
-    
-    return render_template('colour_carnival.html', colors=COLORS, coins=coins)
+        return redirect(url_for('.login'))
 
-@app.route('/api/colour_carnival/spin', methods=['POST'])
+    # The color list is inlined from the content pack: no API round-trip and no database query
+    return render_template('colour_carnival.html', colors=content.current().colors_payload)
+
+@bp.route('/api/colour_carnival/spin', methods=['POST'])
 def colour_carnival_spin():
     """Handle color carnival spin and award coins"""
     if 'user_id' not in session:
@@ -1016,32 +1031,80 @@ def colour_carnival_spin():
         coins_earned = 5
         
         # Update user's coins
-        coins_obj = Coins.query.filter_by(user_id=session['user_id']).first()
-        if not coins_obj:
-            coins_obj = Coins(user_id=session['user_id'], coins=0)
-            db.session.add(coins_obj)
-
-        coins_obj.coins += coins_earned
-        db.session.commit()
+        with unit_of_work():
+            balance = award_coins(session['user_id'], coins_earned, 'carnival')
 
         return jsonify({
             'success': True,
             'coins_earned': coins_earned,
-            'total_coins': coins_obj.coins,
+            'total_coins': balance,
+            'stats': activity_stats(session['user_id'], balance),
             'message': f'You won {coins_earned} coins!'
         })
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     
-@app.route('/api/colors', methods=['GET'])
+@bp.route('/api/events/batch', methods=['POST'])
+def events_batch():
+    """Apply quiz, math, shape and carnival results played offline, in one transaction"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+
+    data = request.get_json(silent=True)
+    events = data.get('events') if isinstance(data, dict) else None
+    if not isinstance(events, list):
+        return jsonify({'success': False, 'error': 'events must be a list'}), 400
+    if len(events) > current_app.config['EVENT_BATCH_LIMIT']:
+        return jsonify({'success': False, 'error': f"At most {current_app.config['EVENT_BATCH_LIMIT']} events per batch"}), 413
+
+    user_id = session['user_id']
+    batch = EventBatch(user_id, content.current(), quiz_attempts, game_states, current_app.config['SHAPE_PASS_SCORE'])
+    with unit_of_work():
+        balance = batch.apply(events)
+
+    balance = balance if balance is not None else get_balance(user_id)
+    return jsonify(dict(
+        batch.summary(),
+        success=True,
+        total_coins=balance,
+        stats=activity_stats(user_id, balance),
+    ))
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Request, SQL and service metrics in Prometheus text format (admins only)"""
+    if not is_admin():
+        return jsonify({'error': 'Not found'}), 404
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@bp.route('/admin/profiles')
+def list_profiles():
+    """Request profiles captured by profiling.py, newest first (admins only)"""
+    if not is_admin():
+        return jsonify({'error': 'Not found'}), 404
+    return render_template('admin_profiles.html', profiles=current_app.extensions['profiles'].list(),
+                           config=current_app.config)
+
+@bp.route('/admin/profiles/<name>')
+def show_profile(name):
+    """One captured profile: pyinstrument HTML or a cProfile summary"""
+    if not is_admin():
+        return jsonify({'error': 'Not found'}), 404
+    found = current_app.extensions['profiles'].read(name)
+    if found is None:
+        return jsonify({'error': 'Not found'}), 404
+    body, mimetype = found
+    return body, 200, {'Content-Type': f'{mimetype}; charset=utf-8'}
+
+@bp.route('/api/colors', methods=['GET'])
 def get_colors():
     """API endpoint to get colors list"""
     if 'user_id' not in session:
         return jsonify({"error": "Not logged in"}), 401
     
-    # Return the existing COLORS list
-    return jsonify(COLORS)
+    # Return the current colors list
+    return jsonify(content.current().colors_payload)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)  
\ No newline at end of file
+    create_app().run(debug=True, port=5000)  
\ No newline at end of file
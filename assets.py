@@ -0,0 +1,200 @@
+"""Fingerprinted, precompressed static assets.
+
+`flask build-assets` copies every file under static/ to static/dist/
+with a content hash in its name (css/shape.css -> css/shape.1a2b3c4d5e6f.css),
+plus .gz and, when the optional brotli package is installed, .br
+variants. The large inline <style> and <script> blocks in the templates
+are extracted to dist/inline/ the same way. Everything is listed in
+dist/manifest.json.
+
+With a manifest present, init_assets() makes url_for('static', ...)
+return the hashed URL, swaps the extracted inline blocks in templates
+for <link>/<script src> tags, and serves dist/ files with the best
+precompressed variant the client accepts and a one-year immutable
+Cache-Control. A changed file gets a new name, so nothing is ever stale.
+Without a manifest (e.g. local development) nothing changes.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_from_directory
+from jinja2 import BaseLoader
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are always built
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+
+# Attribute-less <style> and <script> blocks with no Jinja inside can move to a file as they are
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.S)
+INLINE_EXTENSIONS = {'style': 'css', 'script': 'js'}
+MIN_INLINE_BYTES = 1024  # smaller blocks are cheaper inline than as another request
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=6).hexdigest()
+
+
+def hashed_name(name, data):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{content_hash(data)}{extension}'
+
+
+def inline_blocks(template_name, source):
+    """(start, end, tag, logical name, content) of each extractable block in a template"""
+    stem = os.path.splitext(template_name)[0].replace('/', '_')
+    index = 0
+    for match in INLINE_BLOCK.finditer(source):
+        tag, body = match.groups()
+        if len(body) < MIN_INLINE_BYTES or '{{' in body or '{%' in body or '{#' in body:
+            continue
+        yield match.start(), match.end(), tag, f'inline/{stem}-{index}.{INLINE_EXTENSIONS[tag]}', body
+        index += 1
+
+
+def _write_file(path, data):
+    # Via a temporary name, so a worker never serves a half-written file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def _write(dist, name, data):
+    """Write name, then its precompressed variants; returns the encodings written"""
+    path = os.path.join(dist, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_file(path, data)
+    encodings = []
+    if name.endswith(COMPRESSIBLE):
+        variants = [('gzip', '.gz', gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            variants.insert(0, ('br', '.br', brotli.compress(data, quality=11)))
+        for encoding, suffix, compressed in variants:
+            if len(compressed) < len(data):
+                _write_file(path + suffix, compressed)
+                encodings.append(encoding)
+    return encodings
+
+
+def build_assets(static_folder, template_folder, clean=False):
+    """Fingerprint static files and inline template blocks into static/dist; returns the manifest"""
+    dist = os.path.join(static_folder, DIST)
+    if clean:
+        shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [d for d in dirs if d != DIST]
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            hashed = hashed_name(name, data)
+            manifest[name] = {'path': hashed, 'encodings': _write(dist, hashed, data)}
+
+    for root, _, files in os.walk(template_folder):
+        for filename in files:
+            path = os.path.join(root, filename)
+            template_name = os.path.relpath(path, template_folder).replace(os.sep, '/')
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+            for _, _, _, name, body in inline_blocks(template_name, source):
+                data = body.encode('utf-8')
+                hashed = hashed_name(name, data)
+                manifest[name] = {'path': hashed, 'encodings': _write(dist, hashed, data)}
+
+    # Written last: workers never see a manifest pointing at missing files
+    os.makedirs(dist, exist_ok=True)
+    _write_file(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class InlineAssetLoader(BaseLoader):
+    """Wraps the app's loader; replaces inline blocks the manifest has a matching build of"""
+
+    def __init__(self, loader, manifest):
+        self.loader = loader
+        self.manifest = manifest
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        return self.rewrite(template, source), filename, uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+    def rewrite(self, template, source):
+        parts = []
+        last = 0
+        for start, end, tag, name, body in inline_blocks(template, source):
+            entry = self.manifest.get(name)
+            if entry is None or entry['path'] != hashed_name(name, body.encode('utf-8')):
+                continue  # edited since the last build: keep it inline
+            url = "{{ url_for('static', filename='%s') }}" % name
+            parts += [source[last:start],
+                      f'<link rel="stylesheet" href="{url}">' if tag == 'style' else f'<script src="{url}"></script>']
+            last = end
+        parts.append(source[last:])
+        return ''.join(parts)
+
+
+def init_assets(app):
+    app.config.setdefault('ASSETS_BUILD_ON_STARTUP', False)
+    if app.config['ASSETS_BUILD_ON_STARTUP']:
+        manifest = build_assets(app.static_folder, os.path.join(app.root_path, app.template_folder))
+    else:
+        manifest = load_manifest(app.static_folder)
+    app.extensions['assets'] = manifest
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def fingerprinted_static_url(endpoint, values):
+        if endpoint == 'static':
+            entry = manifest.get(values.get('filename'))
+            if entry is not None:
+                values['filename'] = f"{DIST}/{entry['path']}"
+
+    app.jinja_loader = InlineAssetLoader(app.jinja_loader, manifest)
+
+    served = {f"{DIST}/{entry['path']}": entry['encodings'] for entry in manifest.values()}
+    send_static_file = app.view_functions['static']
+
+    def static(filename):
+        encodings = served.get(filename)
+        if encodings is None:
+            return send_static_file(filename=filename)
+        accepted = next((e for e in encodings if request.accept_encodings[e]), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(accepted, '')
+        response = send_from_directory(app.static_folder, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                       mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if accepted:
+            response.headers['Content-Encoding'] = accepted
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
@@ -0,0 +1,141 @@
+"""Is this email or phone number already registered?
+
+The signup form asks on every keystroke pause, and nearly every answer is
+"no". An in-memory Bloom filter of every registered email and phone
+answers those without touching the database; only a "maybe" runs an
+EXISTS query, which SQLite answers from the unique index alone.
+
+The filter is built on first use, picks up new sign-ups from any worker
+with a cheap `id > last seen` query at most every
+AVAILABILITY_REFRESH_SECONDS, and is rebuilt from scratch every
+AVAILABILITY_REBUILD_SECONDS so edited or deleted accounts age out. A
+stale "no" only lasts until the next refresh; signin() still checks
+the database itself before creating the account.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from sqlalchemy import exists, func, select
+
+from models import db, User
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    return ''.join(filter(str.isdigit, phone or ''))
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a tunable false positive rate"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1000)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self.capacity = capacity
+
+    def _positions(self, value):
+        # Two 64-bit halves of one digest, combined (Kirsch-Mitzenmacher) into k positions
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+# field -> (column, normalizer, key prefix in the shared filter)
+FIELDS = {
+    'email': (User.email, normalize_email, 'e:'),
+    'phone': (User.phone, normalize_phone, 'p:'),
+}
+
+
+class AvailabilityIndex:
+    def __init__(self, refresh_interval=5, rebuild_interval=600, error_rate=0.01):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_user_id = 0
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self.stats = {'filtered': 0, 'queried': 0, 'found': 0}
+
+    def init_app(self, app):
+        self.refresh_interval = app.config.get('AVAILABILITY_REFRESH_SECONDS', self.refresh_interval)
+        self.rebuild_interval = app.config.get('AVAILABILITY_REBUILD_SECONDS', self.rebuild_interval)
+        self.error_rate = app.config.get('AVAILABILITY_ERROR_RATE', self.error_rate)
+        self._filter = None
+
+    def _add_rows(self, bloom, rows):
+        for user_id, email, phone in rows:
+            bloom.add('e:' + normalize_email(email))
+            bloom.add('p:' + normalize_phone(phone))
+            self._last_user_id = max(self._last_user_id, user_id)
+
+    def _rebuild(self):
+        users = db.session.scalar(select(func.count(User.id))) or 0
+        bloom = BloomFilter(capacity=users * 4, error_rate=self.error_rate)  # room to grow before a rebuild
+        self._last_user_id = 0
+        self._add_rows(bloom, db.session.execute(
+            select(User.id, User.email, User.phone).execution_options(yield_per=1000)))
+        self._filter = bloom
+        self._built_at = self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        # New sign-ups since the last look, possibly made by another worker
+        self._add_rows(self._filter, db.session.execute(
+            select(User.id, User.email, User.phone).where(User.id > self._last_user_id)))
+        self._refreshed_at = time.monotonic()
+
+    def _needs_rebuild(self, now):
+        return (self._filter is None or now - self._built_at >= self.rebuild_interval
+                or self._filter.count > self._filter.capacity)  # too full for its error rate
+
+    def _current(self):
+        now = time.monotonic()
+        if self._needs_rebuild(now):
+            with self._lock:
+                if self._needs_rebuild(now):
+                    self._rebuild()
+        elif now - self._refreshed_at >= self.refresh_interval:
+            with self._lock:
+                self._refresh()
+        return self._filter
+
+    def add(self, email, phone):
+        """Call after a sign-up commits, so this worker knows at once"""
+        if self._filter is not None:
+            self._filter.add('e:' + normalize_email(email))
+            self._filter.add('p:' + normalize_phone(phone))
+
+    def exists(self, field, value):
+        """True if an account already uses this email or phone"""
+        column, normalize, prefix = FIELDS[field]
+        normalized = normalize(value)
+        if prefix + normalized not in self._current():
+            self.stats['filtered'] += 1
+            return False
+        self.stats['queried'] += 1
+        stored = normalized if field == 'phone' else value
+        found = db.session.scalar(select(exists().where(column == stored)))
+        self.stats['found'] += found
+        return found
+
+
+availability = AvailabilityIndex()
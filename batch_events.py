@@ -0,0 +1,239 @@
+"""Results played offline, sent later as one batch.
+
+Tablets on flaky Wi-Fi queue finished games and post them to
+/api/events/batch as a list of typed events:
+
+    {"key": "tab7-0042", "type": "math", "level": 3, "score": 8, "coins_earned": 6,
+     "occurred_at": "2024-05-01T09:30:00Z"}
+
+`key` is chosen by the client and makes resending safe: an event whose
+key was already applied for this user is reported as a duplicate and
+skipped. Each event is validated on its own; the accepted ones are
+written with one bulk insert per table, one rollup upsert per day and a
+single coin update, all in the caller's transaction.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy import insert, select
+
+from models import (db, ProcessedEvent, QuizResult, MathResult, ShapeResult,
+                    award_coins_by_activity, record_activities, upsert_insert)
+
+# Tablet clocks drift; anything further ahead than this is refused
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+MAX_KEY_LENGTH = 64
+
+SHAPE_COINS = 10
+CARNIVAL_COINS = 5
+# Most the math game can report for one level: 5 levels, 0-10 points, 10 coins + 0.5 per second left + 20 bonus
+MAX_MATH_LEVEL = 5
+MAX_MATH_SCORE = 10
+MAX_MATH_COINS = 60
+
+
+class EventError(ValueError):
+    """An event that cannot be applied; the message goes back to the client"""
+
+
+class Outcome(NamedTuple):
+    key: str
+    type: str
+    coins: int
+    score: int
+    when: datetime
+    model: type   # result table, or None for events that only earn coins
+    row: dict
+
+
+def _int(event, field, default=None, low=0, high=None):
+    value = event.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise EventError(f'{field} must be a whole number')
+    if value < low or (high is not None and value > high):
+        raise EventError(f'{field} out of range')
+    return value
+
+
+def _occurred_at(event, now):
+    value = event.get('occurred_at')
+    if value is None:
+        return now
+    try:
+        when = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise EventError('occurred_at must be an ISO 8601 timestamp')
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    if when > now + MAX_CLOCK_SKEW:
+        raise EventError('occurred_at is in the future')
+    return when
+
+
+def _math(event, batch):
+    level = _int(event, 'level', 1, high=MAX_MATH_LEVEL)  # 0 is the all-levels bonus, as online
+    score = _int(event, 'score', 0, high=MAX_MATH_SCORE)
+    coins = _int(event, 'coins_earned', 0, high=MAX_MATH_COINS)
+    row = {'level_completed': level, 'score': score, 'coins_awarded': coins}
+    return coins, score, MathResult, row
+
+
+def _shape(event, batch):
+    task_id = event.get('task_id')
+    shapes = event.get('shapes')
+    if task_id not in batch.pack.tasks_by_id:
+        raise EventError('Task not found')
+    if not isinstance(shapes, list) or not all(isinstance(shape, dict) for shape in shapes):
+        raise EventError('shapes must be a list of shapes')
+    valid, message, similarity_score = batch.pack.grade_shapes(task_id, shapes, batch.shape_pass_score)
+    if not valid:
+        raise EventError(message)
+    batch.completed_tasks[event['key']] = task_id
+    row = {'similarity_score': similarity_score, 'coins_awarded': SHAPE_COINS}
+    return SHAPE_COINS, similarity_score, ShapeResult, row
+
+
+def _quiz(event, batch):
+    # Answers are graded here against an attempt started online; the client never sees them
+    answers = event.get('answers')
+    if not isinstance(answers, list):
+        raise EventError('answers must be a list')
+    if not isinstance(event.get('attempt'), str):
+        raise EventError('attempt must be a string')
+    question_ids = batch.quiz_attempts.finish(event.get('attempt'), batch.user_id)
+    if question_ids is None:
+        raise EventError('Quiz attempt expired or already graded')
+    score = 0
+    for question_id, answer in zip(question_ids, answers):
+        q = batch.pack.questions_by_id.get(question_id)
+        if q and str(answer).lower() == q.answer:
+            score += 1
+    return score, score, QuizResult, {'score': score}
+
+
+def _carnival(event, batch):
+    return CARNIVAL_COINS, 0, None, None
+
+
+# type -> handler returning (coins, score, result model, result row)
+EVENT_TYPES = {
+    'quiz': _quiz,
+    'math': _math,
+    'shape': _shape,
+    'carnival': _carnival,
+}
+
+# Result tables name their timestamp column differently
+TIMESTAMP_COLUMNS = {QuizResult: 'date_taken', MathResult: 'created_at', ShapeResult: 'created_at'}
+
+
+class EventBatch:
+    """Validates and applies one client's batch; call apply() once"""
+
+    def __init__(self, user_id, pack, quiz_attempts, game_states, shape_pass_score=0):
+        self.user_id = user_id
+        self.pack = pack
+        self.quiz_attempts = quiz_attempts
+        self.game_states = game_states
+        self.shape_pass_score = shape_pass_score
+        self.completed_tasks = {}  # event key -> shape task id
+        self.accepted = []
+        self.duplicates = []
+        self.rejected = []
+
+    def _reject(self, key, error):
+        self.rejected.append({'key': key, 'error': str(error)})
+
+    def _new_events(self, events):
+        """Well-formed events whose keys have not been applied before"""
+        fresh = {}
+        for event in events:
+            key = event.get('key') if isinstance(event, dict) else None
+            if not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH:
+                self._reject(key, f'key must be a string of 1-{MAX_KEY_LENGTH} characters')
+            elif not isinstance(event.get('type'), str) or event['type'] not in EVENT_TYPES:
+                self._reject(key, f"unknown event type {event.get('type')!r}")
+            elif key in fresh:
+                self.duplicates.append(key)
+            else:
+                fresh[key] = event
+
+        if fresh:
+            seen = db.session.scalars(select(ProcessedEvent.key).where(
+                ProcessedEvent.user_id == self.user_id, ProcessedEvent.key.in_(list(fresh))
+            ))
+            for key in seen:
+                self.duplicates.append(key)
+                del fresh[key]
+        return fresh
+
+    def _claim(self, keys, now):
+        """Record keys as processed; returns the ones no concurrent batch claimed first"""
+        if not keys:
+            return set()
+        stmt = upsert_insert(ProcessedEvent).values([
+            {'user_id': self.user_id, 'key': key, 'created_at': now} for key in keys
+        ]).on_conflict_do_nothing().returning(ProcessedEvent.key)
+        return set(db.session.scalars(stmt))
+
+    def apply(self, events):
+        """Apply what is valid and new; returns the new balance, or None if nothing was applied"""
+        now = datetime.utcnow()
+        outcomes = []
+        for key, event in self._new_events(events).items():
+            try:
+                when = _occurred_at(event, now)
+                coins, score, model, row = EVENT_TYPES[event['type']](event, self)
+            except EventError as e:
+                self._reject(key, e)
+                continue
+            except (ValueError, TypeError) as e:
+                # Input the scorers could not make sense of; reject this event, not the batch
+                self._reject(key, EventError(f'invalid {event["type"]} event: {e}'))
+                continue
+            outcomes.append(Outcome(key, event['type'], coins, score, when, model, row))
+
+        claimed = self._claim([outcome.key for outcome in outcomes], now)
+        for outcome in outcomes:
+            if outcome.key in claimed:
+                self.accepted.append(outcome)
+            else:
+                self.duplicates.append(outcome.key)
+        if not self.accepted:
+            return None
+
+        rows = {}
+        for outcome in self.accepted:
+            if outcome.model is not None:
+                row = dict(outcome.row, user_id=self.user_id)
+                row[TIMESTAMP_COLUMNS[outcome.model]] = outcome.when
+                rows.setdefault(outcome.model, []).append(row)
+        for model, model_rows in rows.items():
+            db.session.execute(insert(model), model_rows)
+
+        record_activities(self.user_id, [
+            (outcome.type, outcome.coins, outcome.score, outcome.when)
+            for outcome in self.accepted if outcome.model is not None
+        ])
+
+        completed = [self.completed_tasks[o.key] for o in self.accepted if o.key in self.completed_tasks]
+        if completed:
+            state = self.game_states.get(self.user_id)
+            state['completed_tasks'].extend(completed)
+            self.game_states.save(self.user_id, state)
+
+        amounts = {}
+        for outcome in self.accepted:
+            amounts[outcome.type] = amounts.get(outcome.type, 0) + outcome.coins
+        return award_coins_by_activity(self.user_id, amounts)
+
+    def summary(self):
+        return {
+            'accepted': [
+                {'key': outcome.key, 'type': outcome.type, 'coins': outcome.coins, 'score': outcome.score}
+                for outcome in self.accepted
+            ],
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'coins_earned': sum(outcome.coins for outcome in self.accepted),
+        }
@@ -0,0 +1,109 @@
+"""Hammer award_coins() from many threads and check no coins are lost.
+
+Every thread awards 1 coin per iteration to the same handful of users,
+each award in its own transaction like a request would. At the end each
+balance must equal the number of awards it received and match its ledger.
+Pass --legacy to run the old read-modify-write code for comparison.
+
+    python benchmarks/coin_stress.py --threads 16 --awards 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import Flask
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Coins, CoinLedger, award_coins  # noqa: E402
+
+
+def legacy_award(user_id, amount, activity):
+    """The read-modify-write the endpoints used before the ledger"""
+    coins_obj = Coins.query.filter_by(user_id=user_id).first()
+    coins_obj.coins += amount
+    return coins_obj.coins
+
+
+granted_lock = threading.Lock()
+
+
+def worker(app, award, users, awards, thread_index, granted, errors):
+    with app.app_context():
+        for i in range(awards):
+            user_id = users[(thread_index + i) % len(users)]
+            for _ in range(50):
+                try:
+                    award(user_id, 1, 'stress')
+                    db.session.commit()
+                    with granted_lock:
+                        granted[user_id] += 1
+                    break
+                except OperationalError:
+                    # SQLite "database is locked"; a real request would retry or fail
+                    db.session.rollback()
+                    time.sleep(0.001)
+            else:
+                errors.append(user_id)
+            db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--awards', type=int, default=200, help='awards per thread')
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+        db.init_app(app)
+
+        users = list(range(1, args.users + 1))
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(Coins(user_id=user_id, coins=0) for user_id in users)
+            db.session.commit()
+
+        award = legacy_award if args.legacy else award_coins
+        granted = Counter()
+        errors = []
+        threads = [
+            threading.Thread(target=worker, args=(app, award, users, args.awards, i, granted, errors))
+            for i in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            balances = dict(db.session.query(Coins.user_id, Coins.coins))
+            ledger = dict(db.session.query(CoinLedger.user_id, func.sum(CoinLedger.amount)).group_by(CoinLedger.user_id))
+
+        total = sum(granted.values())
+        print(f"{'legacy' if args.legacy else 'atomic'}: {total} awards from {args.threads} threads "
+              f"in {elapsed:.2f}s ({total / elapsed:.0f}/s), {len(errors)} gave up")
+        lost = 0
+        for user_id in users:
+            lost += granted[user_id] - balances[user_id]
+            print(f"  user {user_id}: awarded {granted[user_id]}, balance {balances[user_id]}, "
+                  f"ledger {ledger.get(user_id, 0)}")
+        if lost:
+            raise SystemExit(f"{lost} coins lost")
+        print("no coins lost")
+
+
+if __name__ == '__main__':
+    main()
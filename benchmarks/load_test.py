@@ -0,0 +1,322 @@
+"""Load test of every page and API route through the whole app.
+
+Seeds a throwaway SQLite database with USERS children, each with RESULTS
+past results per activity, then runs THREADS virtual users. Each one
+logs in and loops through a play session: dashboard, quiz, shape
+builder, math, colour carnival, progress, until --seconds run out. All
+requests go through create_app() and the Flask test client, so every
+hook (sessions, metrics, the password hasher) is included.
+
+Reports p50/p95/p99 latency, throughput and SQL statements per request
+for each route. --output saves the run as JSON; --compare fails (exit 1)
+when a route's p95 or statement count regressed against a saved run,
+so CI can keep the numbers honest. Every write route in SINGLE_COMMIT
+must also answer with X-DB-Commits: 1 on every request, or the run
+fails: each one is a single unit of work.
+
+    python benchmarks/load_test.py --users 50 --results 200 --threads 8 --seconds 20 --output run.json
+    python benchmarks/load_test.py --compare run.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from models import (db, User, Coins, QuizResult, ShapeResult, MathResult,  # noqa: E402
+                    rebuild_rollups)
+
+PASSWORD = 'load-test'
+
+# Write routes that must commit exactly once per request (see database.unit_of_work)
+SINGLE_COMMIT = (
+    'POST /signin',
+    'POST /quiz',
+    'GET /api/get_task',
+    'POST /api/validate_shape',
+    'POST /api/math/complete',
+    'POST /api/colour_carnival/spin',
+    'POST /profile',
+    'POST /api/events/batch',
+)
+
+# SQL statements run by the current thread; the test client serves each request on the calling thread
+_statements = threading.local()
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    _statements.count = getattr(_statements, 'count', 0) + 1
+
+
+def seed(users, results, hash_method):
+    """USERS children with RESULTS rows per activity spread over the past year"""
+    password_hash = generate_password_hash(PASSWORD, hash_method)  # one hash, shared: seeding stays fast
+    db.session.execute(insert(User), [
+        {'id': user_id, 'username': f'kid{user_id}', 'email': f'kid{user_id}@example.com',
+         'phone': f'555{user_id:07d}', 'password_hash': password_hash,
+         'gender': random.choice(['boy', 'girl']), 'age': random.choice(['3-5', '6-8', '9-12'])}
+        for user_id in range(1, users + 1)
+    ])
+    now = datetime.utcnow()
+    coins = {}
+    for user_id in range(1, users + 1):
+        stamps = [now - timedelta(minutes=random.randint(0, 60 * 24 * 365)) for _ in range(results)]
+        quiz = [{'user_id': user_id, 'score': random.randint(0, 5), 'date_taken': ts} for ts in stamps]
+        shape = [{'user_id': user_id, 'similarity_score': random.randint(50, 100), 'coins_awarded': 10,
+                  'created_at': ts} for ts in stamps]
+        math = [{'user_id': user_id, 'level_completed': random.randint(1, 5), 'score': random.randint(0, 10),
+                 'coins_awarded': random.randint(0, 5), 'created_at': ts} for ts in stamps]
+        if results:
+            db.session.execute(insert(QuizResult), quiz)
+            db.session.execute(insert(ShapeResult), shape)
+            db.session.execute(insert(MathResult), math)
+        coins[user_id] = sum(r['score'] for r in quiz) + sum(r['coins_awarded'] for r in shape + math)
+    db.session.execute(insert(Coins), [{'user_id': user_id, 'coins': total} for user_id, total in coins.items()])
+    db.session.commit()
+    rebuild_rollups()
+
+
+class VirtualUser:
+    """One child's browser: a test client that times every request it makes"""
+
+    def __init__(self, app, user_id, samples):
+        self.client = app.test_client()
+        self.user_id = user_id
+        self.samples = samples  # route -> [(seconds, statements, status, commits)]
+        self.pack = app.extensions['content'].current()
+
+    def request(self, method, route, path=None, **kwargs):
+        _statements.count = 0
+        started = time.perf_counter()
+        response = self.client.open(path or route, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        commits = int(response.headers.get('X-DB-Commits', -1))
+        self.samples[f'{method} {route}'].append((elapsed, _statements.count, response.status_code, commits))
+        return response
+
+    def login(self):
+        self.request('GET', '/login')
+        self.request('POST', '/login', data={'phone': f'555{self.user_id:07d}', 'password': PASSWORD})
+
+    def play(self):
+        self.request('GET', '/dashboard')
+        self.request('GET', '/activities')
+        for page in ('/alphabet', '/numbers', '/drawing', '/careers', '/profile'):
+            self.request('GET', page)
+        self.request('POST', '/profile', data={
+            'username': f'kid{self.user_id}', 'email': f'kid{self.user_id}@example.com',
+            'phone': f'555{self.user_id:07d}', 'age': random.choice(['3-5', '6-8', '9-12']),
+            'avatar_color': random.choice(['#FFD166', '#06D6A0']),
+        })
+
+        # Quiz: pick a category, answer, see the result
+        self.request('GET', '/quiz')
+        category = random.choice(list(self.pack.questions_by_category))
+        self.request('POST', '/quiz', data={'category': category})
+        answers = {f'q{i}': random.choice(['blue', '8', 'water', 'no idea']) for i in range(5)}
+        self.request('POST', '/quiz', data=answers)
+        self.request('GET', '/quiz-result')
+
+        # Shape builder: fetch a task and hand back its own target, which always passes
+        self.request('GET', '/shape_builder')
+        self.request('GET', '/api/bootstrap')
+        task = self.request('GET', '/api/get_task').get_json()
+        self.request('POST', '/api/validate_shape', json={'task_id': task['id'], 'shapes': task['target_shapes']})
+
+        # Math game
+        self.request('GET', '/math')
+        self.request('GET', '/api/bootstrap')
+        self.request('POST', '/api/math/complete',
+                     json={'level': random.randint(1, 5), 'score': random.randint(0, 10), 'coins_earned': 3})
+
+        # Colour carnival
+        self.request('GET', '/colour_carnival')
+        color = random.choice(self.pack.colors)
+        self.request('POST', '/api/colour_carnival/spin', json={'color': color.name, 'code': color.code})
+
+        # Offline events catching up, then the parent looks at progress
+        self.request('POST', '/api/events/batch', json={'events': [
+            {'key': f'{self.user_id}-{time.time_ns()}', 'type': 'carnival', 'color': color.name},
+        ]})
+        self.request('GET', '/progress')
+        self.request('GET', '/progress-data')
+
+    def signup(self):
+        self.request('GET', '/signin')
+        n = random.randint(0, 10 ** 9)
+        self.request('GET', '/api/check-availability', f'/api/check-availability?email=new{n}@example.com')
+        self.request('POST', '/signin', data={
+            'username': f'new{n}', 'email': f'new{n}@example.com', 'phone': f'9{n:09d}',
+            'gender': 'girl', 'age': '6-8', 'password': 'Load-test1',
+        })
+
+
+def run_user(app, user_id, deadline, samples, failures):
+    user = VirtualUser(app, user_id, samples)
+    try:
+        user.signup()
+        user.login()
+        while time.perf_counter() < deadline:
+            user.play()
+    except Exception as exc:  # one broken flow should not hide the others' numbers
+        failures.append(f'user {user_id}: {exc!r}')
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for route, rows in sorted(samples.items()):
+        latencies = [seconds * 1000 for seconds, _, _, _ in rows]
+        routes[route] = {
+            'requests': len(rows),
+            'errors': sum(status >= 500 for _, _, status, _ in rows),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(max(latencies), 3),
+            'statements_per_request': round(sum(count for _, count, _, _ in rows) / len(rows), 2),
+            'commits': sorted({commits for _, _, _, commits in rows}),
+        }
+    requests = sum(route['requests'] for route in routes.values())
+    return routes, {'requests': requests, 'seconds': round(elapsed, 3),
+                    'requests_per_second': round(requests / elapsed, 1)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(routes, baseline, tolerance, floor_ms):
+    """Routes that got slower (p95) or chattier (statements) than the baseline run"""
+    regressions = []
+    for route, before in baseline['routes'].items():
+        now = routes.get(route)
+        if now is None:
+            continue
+        limit = max(before['p95_ms'] * (1 + tolerance), before['p95_ms'] + floor_ms)
+        if now['p95_ms'] > limit:
+            regressions.append(f"{route}: p95 {before['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+        if now['statements_per_request'] > before['statements_per_request'] + 0.5:
+            regressions.append(f"{route}: {before['statements_per_request']:g} -> "
+                               f"{now['statements_per_request']:g} SQL statements per request")
+    return regressions
+
+
+def commit_violations(routes):
+    """SINGLE_COMMIT routes that were never exercised or did not commit exactly once every time"""
+    violations = []
+    for route in SINGLE_COMMIT:
+        stats = routes.get(route)
+        if stats is None:
+            violations.append(f'{route}: never requested')
+        elif stats['commits'] != [1]:
+            violations.append(f"{route}: X-DB-Commits {', '.join(map(str, stats['commits']))}, expected 1")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--results', type=int, default=200, help='past results per activity per user')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=1, help='random seed, for repeatable data and flows')
+    parser.add_argument('--hash-method', default='scrypt', help='password hash method for seeded users')
+    parser.add_argument('--hash-workers', type=int, default=0, help='PASSWORD_HASH_WORKERS (0: inline)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='fail if worse than the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown, as a fraction')
+    parser.add_argument('--floor-ms', type=float, default=2.0, help='p95 changes smaller than this are noise')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'load.db')}",
+            'PASSWORD_HASH_METHOD': args.hash_method,
+            'PASSWORD_HASH_WORKERS': args.hash_workers,
+            'LOG_LEVEL': 'ERROR',
+        })
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            seed(args.users, args.results, args.hash_method)
+            print(f"seeded {args.users} users x {args.results} results per activity "
+                  f"in {time.perf_counter() - started:.1f} s")
+            event.listen(db.engine, 'before_cursor_execute', _count_statement)
+
+        samples = defaultdict(list)
+        failures = []
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        threads = [
+            threading.Thread(target=run_user, args=(app, index % args.users + 1, deadline, samples, failures))
+            for index in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        routes, total = summarize(samples, time.perf_counter() - started)
+
+    print(f"\n{'route':<34} {'reqs':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/req':>8}")
+    for route, stats in routes.items():
+        print(f"{route:<34} {stats['requests']:>6} {stats['errors']:>4} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['statements_per_request']:>8.1f}")
+    print(f"\n{total['requests']} requests in {total['seconds']:.1f} s = {total['requests_per_second']:.0f}/s "
+          f"with {args.threads} threads")
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    result = {
+        'config': vars(args) | {'output': None, 'compare': None},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'commit': git_commit(), 'at': datetime.utcnow().isoformat()},
+        'total': total,
+        'routes': routes,
+        'failures': failures,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"saved to {args.output}")
+
+    problems = list(failures)
+    for violation in commit_violations(routes):
+        print(f"COMMITS {violation}")
+        problems.append(violation)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(routes, json.load(f), args.tolerance, args.floor_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        problems += regressions
+    if problems or any(stats['errors'] for stats in routes.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
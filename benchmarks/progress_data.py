@@ -0,0 +1,115 @@
+"""Compare the old and new /progress-data query paths.
+
+Seeds a throwaway SQLite database with USERS users and RESULTS rows per
+activity each, then times both paths for every user and records the peak
+Python memory allocated while they run.
+
+    python benchmarks/progress_data.py --users 5 --results 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, QuizResult, ShapeResult, MathResult, rebuild_rollups, load_weekly_rollups  # noqa: E402
+
+
+def seed(users, results):
+    now = datetime.utcnow()
+    for user_id in range(1, users + 1):
+        stamps = [now - timedelta(minutes=random.randint(0, 60 * 24 * 365)) for _ in range(results)]
+        db.session.execute(insert(QuizResult), [
+            {'user_id': user_id, 'score': random.randint(0, 5), 'date_taken': ts} for ts in stamps
+        ])
+        db.session.execute(insert(ShapeResult), [
+            {'user_id': user_id, 'similarity_score': random.randint(50, 100), 'coins_awarded': 10, 'created_at': ts}
+            for ts in stamps
+        ])
+        db.session.execute(insert(MathResult), [
+            {'user_id': user_id, 'level_completed': 1, 'score': random.randint(0, 10),
+             'coins_awarded': random.randint(0, 5), 'created_at': ts}
+            for ts in stamps
+        ])
+    db.session.commit()
+    rebuild_rollups()
+
+
+def old_path(user_id):
+    """The pre-rollup implementation: load every result and sum in Python"""
+    quiz_results = QuizResult.query.filter_by(user_id=user_id).all()
+    shape_results = ShapeResult.query.filter_by(user_id=user_id).all()
+    math_results = MathResult.query.filter_by(user_id=user_id).all()
+
+    quiz_total = sum(r.score for r in quiz_results)
+    shape_total_coins = sum(r.coins_awarded for r in shape_results)
+    math_total_coins = sum(r.coins_awarded for r in math_results)
+    sum(r.similarity_score for r in shape_results)
+    sum(r.score for r in math_results)
+
+    today = datetime.now().date()
+    start = today - timedelta(days=today.weekday())
+    coins_per_day = []
+    for i in range(7):
+        day = start + timedelta(days=i)
+        quiz_coins = sum(r.score for r in quiz_results if r.date_taken.date() == day)
+        shape_coins = sum(r.coins_awarded for r in shape_results if r.created_at.date() == day)
+        math_coins = sum(r.coins_awarded for r in math_results if r.created_at.date() == day)
+        coins_per_day.append(quiz_coins + shape_coins + math_coins)
+
+    return quiz_total + shape_total_coins + math_total_coins, coins_per_day
+
+
+def new_path(user_id):
+    totals, week = load_weekly_rollups(user_id)
+    coins_per_day = [row.quiz_coins + row.shape_coins + row.math_coins for row in week]
+    return totals.quiz_coins + totals.shape_coins + totals.math_coins, coins_per_day
+
+
+def measure(fn, users):
+    db.session.expunge_all()
+    tracemalloc.start()
+    started = time.perf_counter()
+    for user_id in range(1, users + 1):
+        fn(user_id)
+        db.session.expunge_all()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / users * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--results', type=int, default=10000, help='results per activity per user')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            seed(args.users, args.results)
+
+            for user_id in range(1, args.users + 1):
+                assert old_path(user_id) == new_path(user_id), f"paths disagree for user {user_id}"
+
+            print(f"{args.users} users x {args.results} results per activity")
+            for name, fn in (('old (ORM + Python sums)', old_path), ('new (rollup tuples)', new_path)):
+                ms, kib = measure(fn, args.users)
+                print(f"  {name:<26} {ms:9.2f} ms/request   peak {kib:10.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
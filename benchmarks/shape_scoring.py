@@ -0,0 +1,63 @@
+"""Micro-benchmarks for shape_scoring.similarity().
+
+Times the full scoring path (parse, pairwise scores, optimal assignment)
+for canvases of growing size against a real task target, with both the
+scipy solver (when installed) and the built-in NumPy one.
+
+    python benchmarks/shape_scoring.py
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shape_scoring  # noqa: E402
+from content import load_pack  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TYPES = ('circle', 'square', 'triangle', 'rectangle')
+
+
+def random_canvas(n):
+    return [
+        {
+            'type': random.choice(TYPES),
+            'color': '#FF6B6B',
+            'position': f"{random.randint(0, 100)}% {random.randint(0, 100)}%",
+            'size': f"{random.randint(20, 200)}px",
+            'rotation': f"{random.randint(0, 359)}deg",
+        }
+        for _ in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2, 10, 50, 100, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    task = load_pack(os.path.join(ROOT, 'content')).shape_tasks[0]
+    target = shape_scoring.parse_shapes(task.shapes)
+
+    solvers = [('numpy', None)]
+    if shape_scoring.scipy_solver() is not None:
+        solvers.insert(0, ('scipy', shape_scoring.scipy_solver()))
+
+    print(f"target: {task.name} ({len(task.shapes)} shapes), best of 5 x {args.repeat} calls")
+    for name, solver in solvers:
+        shape_scoring.linear_sum_assignment = solver
+        for n in args.sizes:
+            canvas = random_canvas(n)
+            best = min(timeit.repeat(
+                lambda: shape_scoring.similarity(canvas, target, task.position_tolerance),
+                number=args.repeat, repeat=5,
+            )) / args.repeat
+            print(f"  {name:<6} {n:5d} shapes  {best * 1e6:8.1f} us/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Concurrent readers and writers against one SQLite file.
+
+Reader processes load the progress page queries (weekly rollups and the
+coin balance) while writer processes record math results with their
+coins, each write in its own transaction like /api/math/complete.
+Separate processes, like separate server workers, so the numbers show
+SQLite's locking rather than the GIL. Runs with the tuned settings from
+database.py by default; pass --baseline for the old rollback-journal
+setup (journal_mode=DELETE, synchronous=FULL).
+
+    python benchmarks/sqlite_concurrency.py --readers 4 --writers 2 --seconds 5
+    python benchmarks/sqlite_concurrency.py --baseline
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_database  # noqa: E402
+from models import db, Coins, MathResult, award_coins, record_activity, load_weekly_rollups  # noqa: E402
+
+BASELINE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT_MS': None,   # pysqlite's own 5 second default
+    'SQLITE_CACHE_SIZE': None,
+    'SQLITE_MMAP_SIZE': None,
+}
+
+
+def read(user_id):
+    load_weekly_rollups(user_id)
+    db.session.scalar(select(Coins.coins).where(Coins.user_id == user_id))
+
+
+def write(user_id):
+    now = datetime.utcnow()
+    award_coins(user_id, 3, 'math')
+    db.session.add(MathResult(user_id=user_id, level_completed=1, score=5, coins_awarded=3, created_at=now))
+    record_activity(user_id, 'math', coins=3, score=5, when=now)
+    db.session.commit()
+
+
+def create_app(path, baseline):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    if baseline:
+        app.config.update(BASELINE)
+    init_database(app)
+    return app
+
+
+def worker(path, baseline, kind, users, seconds, index, results):
+    app = create_app(path, baseline)
+    operation = read if kind == 'read' else write
+    latencies, errors = [], 0
+    with app.app_context():
+        i = index
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(users[i % len(users)])
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                # "database is locked": the request would have failed with a 500
+                db.session.rollback()
+                errors += 1
+            finally:
+                db.session.remove()
+            i += 1
+    results.put((kind, latencies, errors))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def report(name, latencies, errors, elapsed):
+    print(f"  {name}: {len(latencies)} ok ({len(latencies) / elapsed:.0f}/s), {errors} locked, "
+          f"p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms, "
+          f"max {max(latencies, default=0) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--baseline', action='store_true', help='rollback journal, no tuning')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'concurrency.db')
+        app = create_app(path, args.baseline)
+
+        users = list(range(1, args.users + 1))
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(Coins(user_id=user_id, coins=0) for user_id in users)
+            db.session.commit()
+            mode = db.session.connection().exec_driver_sql('PRAGMA journal_mode').scalar()
+            db.session.remove()
+            db.engine.dispose()  # no connections inherited by the workers
+
+        results = multiprocessing.Queue()
+        kinds = ['read'] * args.readers + ['write'] * args.writers
+        processes = [
+            multiprocessing.Process(target=worker, args=(path, args.baseline, kind, users, args.seconds, i, results))
+            for i, kind in enumerate(kinds)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        collected = {'read': ([], 0), 'write': ([], 0)}
+        for _ in processes:
+            kind, latencies, errors = results.get()
+            collected[kind] = (collected[kind][0] + latencies, collected[kind][1] + errors)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        (read_latencies, read_errors), (write_latencies, write_errors) = collected['read'], collected['write']
+
+        print(f"{'baseline' if args.baseline else 'tuned'} (journal_mode={mode}): "
+              f"{args.readers} readers, {args.writers} writers, {elapsed:.1f}s")
+        report('reads', read_latencies, read_errors, elapsed)
+        report('writes', write_latencies, write_errors, elapsed)
+        if write_latencies:
+            print(f"  mean write {statistics.mean(write_latencies) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
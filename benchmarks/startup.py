@@ -0,0 +1,70 @@
+"""Cold start time of a worker: import, create_app() and the first request.
+
+Each run is a fresh interpreter, so imports are really cold. Fails when
+the median total exceeds --budget-ms, to keep autoscaled workers quick
+to come up.
+
+    python benchmarks/startup.py --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line of timings in ms
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'TESTING': True})
+created = time.perf_counter()
+response = flask_app.test_client().get(sys.argv[2])
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import': (imported - started) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (served - created) * 1000,
+    'total': (served - started) * 1000,
+}))
+'''
+
+
+def run_once(database_uri, path):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, database_uri, path],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help='page requested first')
+    parser.add_argument('--budget-ms', type=float, default=1500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        runs = [run_once(database_uri, args.path) for _ in range(args.runs)]
+
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        times = [run[phase] for run in runs]
+        print(f"{phase:>14}: median {statistics.median(times):7.1f} ms, "
+              f"min {min(times):7.1f} ms, max {max(times):7.1f} ms")
+
+    total = statistics.median(run['total'] for run in runs)
+    if total > args.budget_ms:
+        raise SystemExit(f"cold start {total:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    print(f"within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    main()
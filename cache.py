@@ -0,0 +1,147 @@
+"""User and coin-balance caches.
+
+Two layers: a per-request dict on flask.g, so a handler never reads the
+same row twice, and a small process-wide TTL cache shared by the page and
+its follow-up XHRs. Balances are refreshed from the value award_coins()
+returned once its transaction commits; user snapshots are dropped whenever
+a User row is flushed. Other workers see changes within CACHE_TTL_SECONDS.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import g, has_request_context
+from sqlalchemy import event
+
+from models import db, User, Coins
+
+DEFAULT_AVATAR_COLOR = 'linear-gradient(135deg, #FFD166, #FFCC00)'
+DEFAULT_AVATAR_ICON = 'fa-user'
+
+# Read-only copy of the User fields pages need; safe to share across requests
+UserProfile = namedtuple('UserProfile', 'id username age gender avatar_color avatar_icon')
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU dict whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl=10, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove and return the live value for key"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_cache = TTLCache()
+balance_cache = TTLCache()
+
+
+def _request_cache(name):
+    if not has_request_context():
+        return {}
+    if name not in g:
+        setattr(g, name, {})
+    return getattr(g, name)
+
+
+def get_user_profile(user_id):
+    """Cached UserProfile for user_id, or None if the user does not exist"""
+    per_request = _request_cache('user_profiles')
+    profile = per_request.get(user_id, _MISSING)
+    if profile is _MISSING:
+        profile = user_cache.get(user_id)
+        if profile is _MISSING:
+            user = db.session.get(User, user_id)
+            profile = user and UserProfile(
+                id=user.id,
+                username=user.username,
+                age=user.age,
+                gender=user.gender,
+                avatar_color=user.avatar_color or DEFAULT_AVATAR_COLOR,
+                avatar_icon=user.avatar_icon or DEFAULT_AVATAR_ICON,
+            )
+            if profile:
+                user_cache.set(user_id, profile)
+        per_request[user_id] = profile
+    return profile
+
+
+def get_balance(user_id):
+    """Cached coin balance for user_id (0 if the user has no Coins row)"""
+    per_request = _request_cache('balances')
+    balance = per_request.get(user_id, _MISSING)
+    if balance is _MISSING:
+        balance = balance_cache.get(user_id)
+        if balance is _MISSING:
+            balance = db.session.query(Coins.coins).filter(Coins.user_id == user_id).scalar() or 0
+            balance_cache.set(user_id, balance)
+        per_request[user_id] = balance
+    return balance
+
+
+def _collect_user_changes(session, flush_context, instances):
+    changed = session.info.setdefault('changed_users', set())
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+
+def _apply_committed_changes(session):
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.invalidate(user_id)
+        _request_cache('user_profiles').pop(user_id, None)
+    for user_id, balance in session.info.pop('coin_balances', {}).items():
+        balance_cache.set(user_id, balance)
+        _request_cache('balances')[user_id] = balance
+
+
+def _discard_changes(session):
+    session.info.pop('changed_users', None)
+    session.info.pop('coin_balances', None)
+
+
+def init_cache(app):
+    ttl = app.config.get('CACHE_TTL_SECONDS', 10)
+    user_cache.ttl = balance_cache.ttl = ttl
+    for name, listener in (('before_flush', _collect_user_changes),
+                           ('after_commit', _apply_committed_changes),
+                           ('after_rollback', _discard_changes)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
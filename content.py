@@ -0,0 +1,225 @@
+"""Content packs: quiz questions, shape tasks, careers and colors.
+
+Each kind of content lives in CONTENT_DIR as `<kind>.json` plus any number
+of extra packs named `<kind>.<pack>.json` (or .yaml/.yml when PyYAML is
+installed), so new questions ship as data files instead of deploys.
+
+Packs load into immutable records with their lookup tables built once,
+on the first request that needs them rather than at startup.
+ContentStore checks file mtimes at most every CONTENT_RELOAD_SECONDS and
+swaps in a freshly built ContentPack with a single reference assignment.
+Requests that already hold the old pack finish with it undisturbed.
+"""
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import NamedTuple
+
+try:
+    import yaml
+except ImportError:  # YAML packs are optional
+    yaml = None
+
+from shape_scoring import parse_shapes, similarity
+
+logger = logging.getLogger(__name__)
+
+CONTENT_KINDS = ('quiz_questions', 'shape_tasks', 'careers', 'colors')
+
+
+class QuizQuestion(NamedTuple):
+    id: int
+    question: str
+    answer: str
+    category: str
+
+
+class ShapeTask(NamedTuple):
+    id: int
+    name: str
+    description: str
+    shapes: tuple
+    min_shapes: int
+    required_shapes: tuple
+    position_tolerance: int
+
+    def to_client(self):
+        """Only what the browser needs to draw the target"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "target_shapes": list(self.shapes),
+        }
+
+
+class Career(NamedTuple):
+    name: str
+    desc: str
+
+
+class Color(NamedTuple):
+    name: str
+    code: str
+
+
+class ContentPack:
+    """One immutable generation of content plus its lookup tables"""
+
+    __slots__ = ('quiz_questions', 'questions_by_id', 'questions_by_category',
+                 'shape_tasks', 'tasks_by_id', 'task_ids', 'required_shape_types', 'task_targets',
+                 'careers', 'colors', 'colors_payload')
+
+    def __init__(self, quiz_questions, shape_tasks, careers, colors):
+        self.quiz_questions = tuple(quiz_questions)
+        self.questions_by_id = {q.id: q for q in self.quiz_questions}
+        by_category = {}
+        for q in self.quiz_questions:
+            by_category.setdefault(q.category, []).append(q)
+        self.questions_by_category = {category: tuple(qs) for category, qs in by_category.items()}
+
+        self.shape_tasks = tuple(shape_tasks)
+        self.tasks_by_id = {task.id: task for task in self.shape_tasks}
+        self.task_ids = tuple(self.tasks_by_id)
+        self.required_shape_types = {task.id: frozenset(task.required_shapes) for task in self.shape_tasks}
+        self.task_targets = {task.id: parse_shapes(task.shapes) for task in self.shape_tasks}
+
+        self.careers = tuple(careers)
+        self.colors = tuple(colors)
+        self.colors_payload = [color._asdict() for color in self.colors]
+
+    def grade_shapes(self, task_id, user_shapes, pass_score=0):
+        """Check a canvas against a task; returns (valid, message, similarity).
+
+        similarity is None when the canvas fails the shape count or
+        required-type rules before any geometry is compared.
+        """
+        task = self.tasks_by_id[task_id]
+        if len(user_shapes) < task.min_shapes:
+            return False, f"Need at least {task.min_shapes} shapes", None
+
+        user_shape_types = {shape.get('type') for shape in user_shapes if isinstance(shape.get('type'), str)}
+        if not self.required_shape_types[task_id] <= user_shape_types:
+            missing = next(r for r in task.required_shapes if r not in user_shape_types)
+            return False, f"Missing required shape: {missing}", None
+
+        # How closely positions, sizes and rotations match the target (0-100)
+        score = similarity(user_shapes, self.task_targets[task_id], task.position_tolerance)
+        if score < pass_score:
+            return False, f"Almost! Your picture is {score}% like the target", score
+        return True, "Great job! Shape matches!", score
+
+    def pick_task_id(self, completed_tasks):
+        """Random task id not in completed_tasks, or None if every task is done"""
+        completed = set(completed_tasks)
+        if len(completed) * 2 < len(self.task_ids):
+            # Mostly unplayed: a couple of random draws beat building the remaining list
+            while True:
+                task_id = random.choice(self.task_ids)
+                if task_id not in completed:
+                    return task_id
+        remaining = [task_id for task_id in self.task_ids if task_id not in completed]
+        return random.choice(remaining) if remaining else None
+
+
+def _quiz_question(item):
+    return QuizQuestion(int(item['id']), item['question'], str(item['answer']).lower(), item['category'])
+
+
+def _shape_task(item):
+    rules = item['validation_rules']
+    return ShapeTask(
+        id=int(item['id']),
+        name=item['name'],
+        description=item['description'],
+        shapes=tuple(item['shapes']),
+        min_shapes=rules['min_shapes'],
+        required_shapes=tuple(rules['required_shapes']),
+        position_tolerance=rules.get('position_tolerance', 0),
+    )
+
+
+RECORD_BUILDERS = {
+    'quiz_questions': _quiz_question,
+    'shape_tasks': _shape_task,
+    'careers': lambda item: Career(item['name'], item['desc']),
+    'colors': lambda item: Color(item['name'], item['code']),
+}
+
+
+def pack_files(content_dir, kind):
+    extensions = ('json', 'yaml', 'yml') if yaml else ('json',)
+    files = []
+    for ext in extensions:
+        files += glob.glob(os.path.join(content_dir, f'{kind}.{ext}'))
+        files += glob.glob(os.path.join(content_dir, f'{kind}.*.{ext}'))
+    return sorted(files)
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        return yaml.safe_load(f) or []
+
+
+def load_pack(content_dir):
+    records = {}
+    for kind in CONTENT_KINDS:
+        build = RECORD_BUILDERS[kind]
+        records[kind] = [build(item) for path in pack_files(content_dir, kind) for item in _read(path)]
+    return ContentPack(**records)
+
+
+class ContentStore:
+    def __init__(self, content_dir, reload_interval=5):
+        self.content_dir = content_dir
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._mtimes = None
+        self._pack = None
+        self._checked_at = 0.0
+
+    def _scan(self):
+        return {
+            path: os.stat(path).st_mtime_ns
+            for kind in CONTENT_KINDS for path in pack_files(self.content_dir, kind)
+        }
+
+    def current(self):
+        """The newest loaded ContentPack; hold on to it for the whole request"""
+        if self._pack is None:
+            self._load()
+        elif self.reload_interval and time.monotonic() - self._checked_at >= self.reload_interval:
+            self._maybe_reload()
+        return self._pack
+
+    def _load(self):
+        # First use: everyone waits for the one thread doing the load
+        with self._reload_lock:
+            if self._pack is None:
+                self._mtimes = self._scan()
+                self._pack = load_pack(self.content_dir)
+                self._checked_at = time.monotonic()
+
+    def _maybe_reload(self):
+        # Only one thread reloads; everyone else keeps serving the current pack
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            mtimes = self._scan()
+            if mtimes == self._mtimes:
+                return
+            # Recorded up front so a broken file is reported once, not on every check
+            self._mtimes = mtimes
+            self._pack = load_pack(self.content_dir)
+            logger.info('Reloaded content from %s', self.content_dir)
+        except Exception:
+            logger.exception('Content reload failed; keeping the previous content')
+        finally:
+            self._reload_lock.release()
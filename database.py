@@ -0,0 +1,142 @@
+"""Database configuration and transaction helpers shared by the write endpoints.
+
+SQLite is tuned on every new connection: WAL so readers never wait for a
+coin write, synchronous=NORMAL (safe with WAL, one fsync per checkpoint
+instead of per commit), a busy timeout so writers queue instead of
+failing with "database is locked", and a larger page cache and mmap.
+
+Set DATABASE_URL to run on a server database instead, e.g.
+postgresql://kids:secret@db/kids_app; the pool options below then apply
+to it and the SQLite pragmas are skipped.
+"""
+import os
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+DEFAULT_DATABASE_URI = 'sqlite:///users.db'
+
+DATABASE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_CACHE_SIZE': -20000,        # negative means KiB, so about 20 MB per connection
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,            # server databases only; SQLite connections never go stale
+}
+
+# (pragma, config key), applied in this order on connect; a None value skips the pragma
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT_MS'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+)
+
+
+def database_uri():
+    """DATABASE_URL from the environment, or the local SQLite file"""
+    uri = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URI)
+    # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}  # Flask-SQLAlchemy pins in-memory databases to a single connection
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def _pragma_listener(config):
+    pragmas = [(name, config[key]) for name, key in SQLITE_PRAGMAS if config[key] is not None]
+
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    return apply_pragmas
+
+
+def init_database(app):
+    """Configure and bind db to app; call instead of db.init_app(app).
+
+    Values already in app.config win over DATABASE_URL and the defaults,
+    so tests and benchmarks can point at their own database.
+    """
+    for key, value in DATABASE_DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', database_uri())
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _pragma_listener(app.config))
+
+
+@contextmanager
+def unit_of_work():
+    """Run the block as one transaction: a single commit, or a rollback on error.
+
+    Write endpoints do all their inserts and updates inside one of these so
+    each request costs exactly one commit (one fsync on SQLite).
+    """
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _count_commit(session):
+    if has_request_context():
+        g.db_commits = g.get('db_commits', 0) + 1
+
+
+def init_commit_counter(app):
+    """Count commits per request and warn when a request makes more than one.
+
+    In debug and testing mode the count is also sent back in an
+    X-DB-Commits response header so it can be asserted on.
+    """
+    if not event.contains(db.session, 'after_commit', _count_commit):
+        event.listen(db.session, 'after_commit', _count_commit)
+
+    @app.after_request
+    def report_commits(response):
+        commits = g.get('db_commits', 0)
+        if commits > 1:
+            app.logger.warning('%s %s made %d commits', request.method, request.path, commits)
+        if app.debug or app.testing:
+            response.headers['X-DB-Commits'] = str(commits)
+        return response
+
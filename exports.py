@@ -0,0 +1,95 @@
+"""Streaming exports of a child's full activity history.
+
+Each export walks one result table (or the coin ledger) for one user in
+index order with yield_per, so rows come off the cursor in batches
+instead of being loaded with .all(). They are written out as CSV or
+NDJSON in ~64 KiB chunks, gzipped on the fly when the client accepts
+it, so a multi-year history streams in constant memory.
+"""
+import csv
+import io
+import json
+import zlib
+
+from models import db, QuizResult, ShapeResult, MathResult, CoinLedger
+
+BATCH_ROWS = 1000
+CHUNK_BYTES = 64 * 1024
+
+# kind -> (model, timestamp column, exported columns); ordered like the (user_id, timestamp) index
+EXPORTS = {
+    'quiz': (QuizResult, QuizResult.date_taken, (QuizResult.id, QuizResult.date_taken, QuizResult.score)),
+    'shape': (ShapeResult, ShapeResult.created_at,
+              (ShapeResult.id, ShapeResult.created_at, ShapeResult.similarity_score, ShapeResult.coins_awarded)),
+    'math': (MathResult, MathResult.created_at,
+             (MathResult.id, MathResult.created_at, MathResult.level_completed, MathResult.score,
+              MathResult.coins_awarded)),
+    'coins': (CoinLedger, CoinLedger.created_at,
+              (CoinLedger.id, CoinLedger.created_at, CoinLedger.activity, CoinLedger.amount)),
+}
+
+
+def export_query(kind, user_id):
+    """The user's rows of one kind, oldest first, straight off the index"""
+    model, taken_at, columns = EXPORTS[kind]
+    return db.session.query(*columns).filter(model.user_id == user_id).order_by(taken_at, model.id)
+
+
+def column_names(kind):
+    return [column.key for column in EXPORTS[kind][2]]
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _rows(kind, user_id):
+    return export_query(kind, user_id).yield_per(BATCH_ROWS)
+
+
+def _chunked(lines):
+    buffered, size = [], 0
+    for line in lines:
+        buffered.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buffered)
+            buffered, size = [], 0
+    if buffered:
+        yield ''.join(buffered)
+
+
+def csv_chunks(kind, user_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def lines():
+        writer.writerow(column_names(kind))
+        for row in _rows(kind, user_id):
+            writer.writerow([_value(value) for value in row])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return _chunked(lines())
+
+
+def ndjson_chunks(kinds, user_id):
+    def lines():
+        for kind in kinds:
+            names = column_names(kind)
+            for row in _rows(kind, user_id):
+                record = {'type': kind}
+                record.update(zip(names, map(_value, row)))
+                yield json.dumps(record) + '\n'
+
+    return _chunked(lines())
+
+
+def gzip_chunks(chunks):
+    """gzip a stream of str chunks as they come; each chunk is flushed to the client"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,146 @@
+"""Per-user game state kept on the server between requests.
+
+Shape builder progress (current task, completed tasks) and ungraded quiz
+attempts, each with two interchangeable backends picked with
+GAME_STATE_BACKEND:
+
+- 'sql' (default): rows in the database, so every worker process sees the
+  same state. Writes join the caller's transaction.
+- 'memory': a bounded LRU with TTL inside this process. Fine for a single
+  worker or local development.
+
+Both forget state after GAME_STATE_TTL_SECONDS without activity, so it
+stays bounded no matter how many users have ever played.
+"""
+import secrets
+from datetime import datetime, timedelta
+
+from cache import TTLCache
+from models import db, ShapeGameState, QuizAttempt, upsert_insert
+
+
+def new_state():
+    return {'current_task': None, 'completed_tasks': []}
+
+
+class MemoryGameStateStore:
+    def __init__(self, ttl=86400, maxsize=10000):
+        self._states = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def get(self, user_id):
+        state = self._states.get(user_id, None)
+        return dict(state, completed_tasks=list(state['completed_tasks'])) if state else new_state()
+
+    def save(self, user_id, state):
+        self._states.set(user_id, dict(state, completed_tasks=list(state['completed_tasks'])))
+
+    def purge(self):
+        return 0
+
+
+class SQLGameStateStore:
+    def __init__(self, ttl=86400):
+        self.ttl = timedelta(seconds=ttl)
+
+    def get(self, user_id):
+        row = db.session.query(
+            ShapeGameState.current_task, ShapeGameState.completed_tasks, ShapeGameState.updated_at
+        ).filter(ShapeGameState.user_id == user_id).first()
+        if not row or row.updated_at < datetime.utcnow() - self.ttl:
+            return new_state()
+        return {'current_task': row.current_task, 'completed_tasks': list(row.completed_tasks)}
+
+    def save(self, user_id, state):
+        """Upsert the state; does not commit"""
+        values = {
+            'current_task': state['current_task'],
+            'completed_tasks': list(state['completed_tasks']),
+            'updated_at': datetime.utcnow(),
+        }
+        stmt = upsert_insert(ShapeGameState).values(user_id=user_id, **values)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['user_id'], set_=values))
+
+    def purge(self):
+        """Delete expired rows and commit; returns how many were removed"""
+        removed = ShapeGameState.query.filter(
+            ShapeGameState.updated_at < datetime.utcnow() - self.ttl
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+
+class MemoryQuizAttemptStore:
+    def __init__(self, ttl=86400, maxsize=10000):
+        self._attempts = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def start(self, user_id, question_ids):
+        attempt_id = secrets.token_urlsafe(9)
+        self._attempts.set(attempt_id, (user_id, tuple(question_ids)))
+        return attempt_id
+
+    def finish(self, attempt_id, user_id):
+        """Remove the attempt and return its question ids, or None if unknown"""
+        attempt = self._attempts.get(attempt_id, None)
+        if attempt is None or attempt[0] != user_id:
+            return None
+        # pop() again decides the race between two submissions of one attempt
+        attempt = self._attempts.pop(attempt_id)
+        return list(attempt[1]) if attempt else None
+
+    def purge(self):
+        return 0
+
+
+class SQLQuizAttemptStore:
+    def __init__(self, ttl=86400):
+        self.ttl = timedelta(seconds=ttl)
+
+    def start(self, user_id, question_ids):
+        """Record the attempt and return its id; does not commit"""
+        attempt_id = secrets.token_urlsafe(9)
+        db.session.add(QuizAttempt(id=attempt_id, user_id=user_id, question_ids=list(question_ids)))
+        return attempt_id
+
+    def finish(self, attempt_id, user_id):
+        """Delete the attempt and return its question ids, or None if unknown.
+
+        A single DELETE ... RETURNING, so two submissions of the same attempt
+        can never both be graded. Does not commit.
+        """
+        table = QuizAttempt.__table__
+        question_ids = db.session.execute(
+            table.delete().where(
+                table.c.id == attempt_id,
+                table.c.user_id == user_id,
+                table.c.created_at >= datetime.utcnow() - self.ttl
+            ).returning(table.c.question_ids)
+        ).scalar()
+        return list(question_ids) if question_ids is not None else None
+
+    def purge(self):
+        """Delete expired attempts and commit; returns how many were removed"""
+        removed = QuizAttempt.query.filter(
+            QuizAttempt.created_at < datetime.utcnow() - self.ttl
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+
+def create_game_state_store(app):
+    backend = app.config.get('GAME_STATE_BACKEND', 'sql')
+    ttl = app.config.get('GAME_STATE_TTL_SECONDS', 86400)
+    if backend == 'memory':
+        return MemoryGameStateStore(ttl=ttl, maxsize=app.config.get('GAME_STATE_MAX_USERS', 10000))
+    if backend == 'sql':
+        return SQLGameStateStore(ttl=ttl)
+    raise ValueError(f"Unknown GAME_STATE_BACKEND: {backend!r}")
+
+
+def create_quiz_attempt_store(app):
+    backend = app.config.get('GAME_STATE_BACKEND', 'sql')
+    ttl = app.config.get('GAME_STATE_TTL_SECONDS', 86400)
+    if backend == 'memory':
+        return MemoryQuizAttemptStore(ttl=ttl, maxsize=app.config.get('GAME_STATE_MAX_USERS', 10000))
+    if backend == 'sql':
+        return SQLQuizAttemptStore(ttl=ttl)
+    raise ValueError(f"Unknown GAME_STATE_BACKEND: {backend!r}")
@@ -0,0 +1,138 @@
+"""Coin balance changes pushed to the browser over Server-Sent Events.
+
+Every transaction that awards coins leaves the new balance in
+session.info['coin_balances'] (see award_coins_by_activity). After it
+commits, LiveUpdates publishes that balance to each open stream of the
+user, so the pages update without polling.
+
+The pub/sub is in-process: a user's stream only hears about commits made
+by the same worker process. Each subscriber has a bounded queue; when a
+slow client falls behind, its oldest update is dropped, since only the
+newest balance matters. An idle stream costs a parked thread and a
+heartbeat comment every LIVE_HEARTBEAT_SECONDS, never a database query.
+
+A stream holds its worker thread for as long as the page is open, so it
+needs a server that runs many requests at once: gunicorn with
+--worker-class gthread (set LIVE_WORKER_THREADS to its --threads) or
+gevent/eventlet, or the threaded development server. Under a sync
+worker one open page would block everyone else, so available() is False
+there: /api/bootstrap tells the pages not to subscribe, and the stream
+endpoint refuses. With LIVE_WORKER_THREADS set, at most half of the
+threads are given to streams unless LIVE_MAX_SUBSCRIBERS says otherwise.
+LIVE_UPDATES_ENABLED = False turns streams off everywhere.
+"""
+import json
+import queue
+import sys
+import threading
+
+from sqlalchemy import event
+
+from models import db
+
+
+class TooManySubscribers(Exception):
+    """LIVE_MAX_SUBSCRIBERS streams are already open in this process"""
+
+
+class LiveUpdates:
+    def __init__(self, queue_size=16, max_subscribers=1000, heartbeat=15):
+        self.enabled = True
+        self.queue_size = queue_size
+        self.max_subscribers = self.default_max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of queue.Queue
+        self.stats = {'subscribers': 0, 'published': 0, 'dropped': 0}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LIVE_UPDATES_ENABLED', True)
+        self.queue_size = app.config.get('LIVE_QUEUE_SIZE', self.queue_size)
+        threads = app.config.get('LIVE_WORKER_THREADS')
+        # Leave half of a gthread worker's threads for ordinary requests
+        default_cap = threads // 2 if threads else self.default_max_subscribers
+        self.max_subscribers = app.config.get('LIVE_MAX_SUBSCRIBERS', default_cap)
+        self.heartbeat = app.config.get('LIVE_HEARTBEAT_SECONDS', self.heartbeat)
+        if not event.contains(db.session, 'after_commit', _publish_committed_balances):
+            # insert=True: run before cache.py's listener, which pops coin_balances
+            event.listen(db.session, 'after_commit', _publish_committed_balances, insert=True)
+
+    def available(self, environ):
+        """True if this server can hold a stream open without blocking other requests"""
+        return bool(self.enabled and self.max_subscribers > 0 and (environ.get('wsgi.multithread') or _green()))
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self.stats['subscribers'] >= self.max_subscribers:
+                raise TooManySubscribers(f'{self.max_subscribers} live streams already open')
+            subscriber = queue.Queue(maxsize=self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            self.stats['subscribers'] += 1
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            if subscriber in subscribers:
+                subscribers.discard(subscriber)
+                self.stats['subscribers'] -= 1
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, name, data):
+        """Queue an event for every open stream of user_id; never blocks"""
+        with self._lock:
+            subscribers = tuple(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        message = self.message(name, data)
+        dropped = 0
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()  # drop the oldest; the newest balance wins
+                        dropped += 1
+                    except queue.Empty:
+                        pass
+        with self._lock:
+            self.stats['published'] += len(subscribers)
+            self.stats['dropped'] += dropped
+
+    def stream(self, subscriber, initial=None):
+        """SSE body for one client; unsubscribe when the response closes"""
+        yield f'retry: {int(self.heartbeat * 1000)}\n\n'
+        if initial:
+            yield initial
+        while True:
+            try:
+                yield subscriber.get(timeout=self.heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'  # comment line; writing it is how a dropped client is noticed
+
+    @staticmethod
+    def message(name, data):
+        """One SSE event"""
+        return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+live_updates = LiveUpdates()
+
+
+def _green():
+    # gevent and eventlet workers run each request on a greenlet; a parked stream costs almost nothing
+    gevent = sys.modules.get('gevent.monkey')
+    eventlet = sys.modules.get('eventlet.patcher')
+    return bool(gevent and gevent.is_module_patched('socket') or eventlet and eventlet.is_monkey_patched('socket'))
+
+
+def _publish_committed_balances(session):
+    for user_id, balance in session.info.get('coin_balances', {}).items():
+        live_updates.publish(user_id, 'balance', {'coins': balance})
@@ -0,0 +1,35 @@
+"""server-side quiz attempts
+
+Revision ID: 0a9d4e7c3b06
+Revises: f18c2a6b9e05
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9d4e7c3b06'
+down_revision = 'f18c2a6b9e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'quiz_attempt' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('quiz_attempt',
+        sa.Column('id', sa.String(length=16), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('question_ids', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_quiz_attempt_created_at'), 'quiz_attempt', ['created_at'])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_quiz_attempt_created_at'), table_name='quiz_attempt')
+    op.drop_table('quiz_attempt')
@@ -0,0 +1,34 @@
+"""idempotency keys for batched offline events
+
+Revision ID: 1c6b2e8f4d07
+Revises: 0a9d4e7c3b06
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c6b2e8f4d07'
+down_revision = '0a9d4e7c3b06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'processed_event' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('processed_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'key', name='uq_processed_event_user_id_key')
+    )
+
+
+def downgrade():
+    op.drop_table('processed_event')
@@ -0,0 +1,105 @@
+"""initial schema and user avatar/statistics columns
+
+Replaces the hand-run add_columns.sql. Databases created by db.create_all()
+before migrations existed already have these tables, so everything here is
+only created when missing.
+
+Revision ID: 3f1a9c2d7b01
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def user_stat_columns():
+    return [
+        sa.Column('avatar_color', sa.String(length=100), nullable=True),
+        sa.Column('avatar_icon', sa.String(length=50), nullable=True),
+        sa.Column('drawings_created', sa.Integer(), nullable=True),
+        sa.Column('favorites_count', sa.Integer(), nullable=True),
+        sa.Column('days_active', sa.Integer(), nullable=True),
+        sa.Column('last_active', sa.DateTime(), nullable=True),
+    ]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'user' not in tables:
+        op.create_table('user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('phone', sa.String(length=20), nullable=False),
+            sa.Column('password_hash', sa.String(length=128), nullable=False),
+            sa.Column('gender', sa.String(length=10), nullable=True),
+            sa.Column('age', sa.String(length=10), nullable=True),
+            *user_stat_columns(),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('phone')
+        )
+    else:
+        existing = {column['name'] for column in inspector.get_columns('user')}
+        with op.batch_alter_table('user') as batch_op:
+            for column in user_stat_columns():
+                if column.name not in existing:
+                    batch_op.add_column(column)
+
+    if 'quiz_result' not in tables:
+        op.create_table('quiz_result',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('score', sa.Integer(), nullable=False),
+            sa.Column('date_taken', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'coins' not in tables:
+        op.create_table('coins',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('coins', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id')
+        )
+
+    if 'shape_result' not in tables:
+        op.create_table('shape_result',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('similarity_score', sa.Integer(), nullable=False),
+            sa.Column('coins_awarded', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'math_result' not in tables:
+        op.create_table('math_result',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('level_completed', sa.Integer(), nullable=False),
+            sa.Column('score', sa.Integer(), nullable=False),
+            sa.Column('coins_awarded', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('math_result')
+    op.drop_table('shape_result')
+    op.drop_table('coins')
+    op.drop_table('quiz_result')
+    op.drop_table('user')
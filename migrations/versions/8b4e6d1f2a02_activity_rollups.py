@@ -0,0 +1,54 @@
+"""activity rollup tables
+
+Run `flask rebuild-rollups` after upgrading to backfill existing results.
+
+Revision ID: 8b4e6d1f2a02
+Revises: 3f1a9c2d7b01
+Create Date: 2026-10-18 12:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d1f2a02'
+down_revision = '3f1a9c2d7b01'
+branch_labels = None
+depends_on = None
+
+
+def counter_columns():
+    return [
+        sa.Column(f'{activity}_{field}', sa.Integer(), nullable=False, server_default='0')
+        for activity in ('quiz', 'shape', 'math')
+        for field in ('coins', 'attempts', 'score_sum')
+    ]
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'daily_activity' not in tables:
+        op.create_table('daily_activity',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            *counter_columns(),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', 'day', name='uq_daily_activity_user_id_day')
+        )
+
+    if 'activity_totals' not in tables:
+        op.create_table('activity_totals',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            *counter_columns(),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', name='uq_activity_totals_user_id')
+        )
+
+
+def downgrade():
+    op.drop_table('activity_totals')
+    op.drop_table('daily_activity')
@@ -0,0 +1,35 @@
+"""composite (user_id, timestamp) indexes on result tables
+
+Revision ID: c52d08e9f403
+Revises: 8b4e6d1f2a02
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d08e9f403'
+down_revision = '8b4e6d1f2a02'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_quiz_result_user_id_date_taken', 'quiz_result', ['user_id', 'date_taken']),
+    ('ix_shape_result_user_id_created_at', 'shape_result', ['user_id', 'created_at']),
+    ('ix_math_result_user_id_created_at', 'math_result', ['user_id', 'created_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
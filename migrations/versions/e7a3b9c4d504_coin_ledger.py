@@ -0,0 +1,43 @@
+"""append-only coin ledger
+
+Existing balances are carried over as one 'opening' entry per user so the
+ledger always sums to Coins.coins.
+
+Revision ID: e7a3b9c4d504
+Revises: c52d08e9f403
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b9c4d504'
+down_revision = 'c52d08e9f403'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'coin_ledger' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('coin_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('activity', sa.String(length=16), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_coin_ledger_user_id_created_at', 'coin_ledger', ['user_id', 'created_at'])
+    op.execute(
+        "INSERT INTO coin_ledger (user_id, activity, amount, created_at) "
+        "SELECT user_id, 'opening', coins, CURRENT_TIMESTAMP FROM coins WHERE coins <> 0"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_coin_ledger_user_id_created_at', table_name='coin_ledger')
+    op.drop_table('coin_ledger')
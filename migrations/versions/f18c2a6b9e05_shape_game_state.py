@@ -0,0 +1,35 @@
+"""shared shape builder game state
+
+Revision ID: f18c2a6b9e05
+Revises: e7a3b9c4d504
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f18c2a6b9e05'
+down_revision = 'e7a3b9c4d504'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'shape_game_state' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('shape_game_state',
+        sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('current_task', sa.Integer(), nullable=True),
+        sa.Column('completed_tasks', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_shape_game_state_updated_at'), 'shape_game_state', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_shape_game_state_updated_at'), table_name='shape_game_state')
+    op.drop_table('shape_game_state')
@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, date
+from sqlalchemy import func, insert
+from datetime import datetime, date, timedelta
+from collections import namedtuple
 from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
 
 db = SQLAlchemy()
 
@@ -83,6 +84,8 @@ class User(db.Model):
 
 # ---------------- QUIZ RESULT ----------------
 class QuizResult(db.Model):
+    __table_args__ = (db.Index('ix_quiz_result_user_id_date_taken', 'user_id', 'date_taken'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
     score = db.Column(db.Integer, nullable=False)
@@ -96,8 +99,21 @@ class Coins(db.Model):
     coins = db.Column(db.Integer, default=0)
 
 
+# Append-only record of every balance change; never updated or deleted
+class CoinLedger(db.Model):
+    __table_args__ = (db.Index('ix_coin_ledger_user_id_created_at', 'user_id', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    activity = db.Column(db.String(16), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 # ---------------- SHAPE BUILDER RESULT ----------------
 class ShapeResult(db.Model):
+    __table_args__ = (db.Index('ix_shape_result_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
     similarity_score = db.Column(db.Integer, nullable=False)
@@ -107,9 +123,228 @@ class ShapeResult(db.Model):
 
 # ---------------- MATH GAME RESULT ----------------
 class MathResult(db.Model):
+    __table_args__ = (db.Index('ix_math_result_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
     level_completed = db.Column(db.Integer, nullable=False)
     score = db.Column(db.Integer, nullable=False)
     coins_awarded = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------- SHAPE BUILDER GAME STATE ----------------
+# Current task and completed tasks per user, shared by every worker process
+class ShapeGameState(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    current_task = db.Column(db.Integer)
+    completed_tasks = db.Column(db.JSON, nullable=False, default=list)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+# ---------------- OFFLINE EVENTS ----------------
+# Idempotency keys of events already applied by /api/events/batch
+class ProcessedEvent(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_processed_event_user_id_key'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------- QUIZ ATTEMPTS ----------------
+# Questions handed out for a quiz that has not been graded yet
+class QuizAttempt(db.Model):
+    id = db.Column(db.String(16), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    question_ids = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+# ---------------- ACTIVITY ROLLUPS ----------------
+# Per-user counters kept up to date in the same transaction as each result
+# insert, so /progress reads a handful of rows instead of every result.
+ROLLUP_ACTIVITIES = ('quiz', 'shape', 'math')
+ROLLUP_FIELDS = ('coins', 'attempts', 'score_sum')
+ROLLUP_COLUMNS = tuple(f'{activity}_{field}' for activity in ROLLUP_ACTIVITIES for field in ROLLUP_FIELDS)
+
+# Plain tuple view of a rollup row; reads never build ORM objects
+RollupCounts = namedtuple('RollupCounts', ROLLUP_COLUMNS)
+RollupCounts.zero = RollupCounts(*[0] * len(ROLLUP_COLUMNS))
+
+
+class ActivityCounters:
+    quiz_coins = db.Column(db.Integer, nullable=False, default=0)
+    quiz_attempts = db.Column(db.Integer, nullable=False, default=0)
+    quiz_score_sum = db.Column(db.Integer, nullable=False, default=0)
+    shape_coins = db.Column(db.Integer, nullable=False, default=0)
+    shape_attempts = db.Column(db.Integer, nullable=False, default=0)
+    shape_score_sum = db.Column(db.Integer, nullable=False, default=0)
+    math_coins = db.Column(db.Integer, nullable=False, default=0)
+    math_attempts = db.Column(db.Integer, nullable=False, default=0)
+    math_score_sum = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def empty(cls, **values):
+        """Unsaved row with every counter zeroed unless given in values"""
+        return cls(**{**dict.fromkeys(ROLLUP_COLUMNS, 0), **values})
+
+
+class DailyActivity(ActivityCounters, db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', name='uq_daily_activity_user_id_day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+
+class ActivityTotals(ActivityCounters, db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', name='uq_activity_totals_user_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+
+
+def upsert_insert(model):
+    """INSERT construct that supports on_conflict_do_update() on the current database"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def _upsert(model, key, increments, returning=None):
+    """INSERT the row or add the increments to the existing one, in one statement"""
+    columns = model.__table__.c
+    stmt = upsert_insert(model).values(**key, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={name: columns[name] + amount for name, amount in increments.items()}
+    )
+    if returning is not None:
+        return db.session.execute(stmt.returning(columns[returning])).scalar()
+    db.session.execute(stmt)
+
+
+def award_coins(user_id, amount, activity):
+    """Add amount to the user's balance and append it to the coin ledger.
+
+    The balance changes with a single atomic upsert (coins = coins + amount)
+    rather than a read-modify-write, so concurrent awards cannot overwrite
+    each other. Does not commit; returns the new balance.
+    """
+    return award_coins_by_activity(user_id, {activity: amount})
+
+
+def award_coins_by_activity(user_id, amounts):
+    """award_coins() for several activities at once: one balance update, one ledger insert"""
+    now = datetime.utcnow()
+    balance = _upsert(Coins, {'user_id': user_id}, {'coins': sum(amounts.values())}, returning='coins')
+    entries = [
+        {'user_id': user_id, 'activity': activity, 'amount': amount, 'created_at': now}
+        for activity, amount in amounts.items() if amount
+    ]
+    if entries:  # e.g. a quiz with no right answers: the balance row still exists, no ledger line
+        db.session.execute(insert(CoinLedger), entries)
+    # Picked up by the balance cache once this transaction commits
+    db.session.info.setdefault('coin_balances', {})[user_id] = balance
+    return balance
+
+
+def record_activity(user_id, activity, coins, score, when):
+    """Add one result to the user's daily and lifetime rollups.
+
+    Does not commit; call it next to the result insert so both land in the
+    same transaction.
+    """
+    record_activities(user_id, [(activity, coins, score, when)])
+
+
+def record_activities(user_id, results):
+    """record_activity() for many (activity, coins, score, when) results.
+
+    Results are summed per day first, so a batch costs one upsert per
+    distinct day plus one for the lifetime totals.
+    """
+    by_day = {}
+    totals = {}
+    for activity, coins, score, when in results:
+        for increments in (by_day.setdefault(when.date(), {}), totals):
+            increments[f'{activity}_coins'] = increments.get(f'{activity}_coins', 0) + coins
+            increments[f'{activity}_attempts'] = increments.get(f'{activity}_attempts', 0) + 1
+            increments[f'{activity}_score_sum'] = increments.get(f'{activity}_score_sum', 0) + score
+
+    for day, increments in by_day.items():
+        _upsert(DailyActivity, {'user_id': user_id, 'day': day}, increments)
+    if totals:
+        _upsert(ActivityTotals, {'user_id': user_id}, totals)
+
+
+def load_activity_totals(user_id):
+    """The user's lifetime RollupCounts, from one indexed lookup"""
+    totals = db.session.query(
+        *(ActivityTotals.__table__.c[name] for name in ROLLUP_COLUMNS)
+    ).filter(ActivityTotals.user_id == user_id).first()
+    return RollupCounts(*totals) if totals else RollupCounts.zero
+
+
+def load_weekly_rollups(user_id, today=None):
+    """Return the user's lifetime totals and one rollup per day of today's week.
+
+    Two indexed lookups returning plain tuples: the totals row and at most
+    seven daily rows, however long the user's history is.
+    """
+    today = today or datetime.utcnow().date()  # rollup days are UTC, like the results they count
+    start_of_week = today - timedelta(days=today.weekday())
+    week_days = [start_of_week + timedelta(days=i) for i in range(7)]
+
+    totals = load_activity_totals(user_id)
+
+    rows = db.session.query(
+        DailyActivity.day, *(DailyActivity.__table__.c[name] for name in ROLLUP_COLUMNS)
+    ).filter(
+        DailyActivity.user_id == user_id,
+        DailyActivity.day.between(week_days[0], week_days[-1])
+    )
+    by_day = {day: RollupCounts(*counts) for day, *counts in rows}
+
+    week = [by_day.get(day, RollupCounts.zero) for day in week_days]
+    return totals, week
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the raw result tables"""
+    sources = {
+        'quiz': (QuizResult, QuizResult.date_taken, QuizResult.score, QuizResult.score),
+        'shape': (ShapeResult, ShapeResult.created_at, ShapeResult.coins_awarded, ShapeResult.similarity_score),
+        'math': (MathResult, MathResult.created_at, MathResult.coins_awarded, MathResult.score),
+    }
+    daily = {}
+    totals = {}
+
+    for activity, (model, taken_at, coins, score) in sources.items():
+        day = func.date(taken_at)
+        rows = db.session.query(
+            model.user_id, day, func.sum(coins), func.count(), func.sum(score)
+        ).filter(taken_at.isnot(None)).group_by(model.user_id, day)
+
+        for user_id, day_value, coins_sum, attempts, score_sum in rows:
+            for counters in (daily.setdefault((user_id, day_value), {}), totals.setdefault(user_id, {})):
+                counters[f'{activity}_coins'] = counters.get(f'{activity}_coins', 0) + (coins_sum or 0)
+                counters[f'{activity}_attempts'] = counters.get(f'{activity}_attempts', 0) + attempts
+                counters[f'{activity}_score_sum'] = counters.get(f'{activity}_score_sum', 0) + (score_sum or 0)
+
+    DailyActivity.query.delete()
+    ActivityTotals.query.delete()
+    db.session.add_all(
+        DailyActivity.empty(user_id=user_id, day=date.fromisoformat(str(day_value)), **counters)
+        for (user_id, day_value), counters in daily.items()
+    )
+    db.session.add_all(
+        ActivityTotals.empty(user_id=user_id, **counters)
+        for user_id, counters in totals.items()
+    )
+    db.session.commit()
+    return len(totals)
@@ -0,0 +1,236 @@
+"""Logging setup and request / SQL metrics.
+
+configure_logging() sends every module's logger to stderr at LOG_LEVEL,
+as plain text or, with LOG_FORMAT='json', one JSON object per line with
+any `extra=` fields included.
+
+init_metrics() times every request and every SQL statement it runs.
+Per route it keeps a latency histogram, a histogram of statements per
+request and total SQL time. Statements slower than SLOW_QUERY_MS are
+logged and kept in a short ring buffer. A request that runs more than
+QUERY_BUDGET statements, or repeats one statement N_PLUS_ONE_REPEATS
+times, is logged as a likely N+1. metrics.render() writes everything in
+Prometheus text format.
+"""
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        extras = ' '.join(f'{key}={value}' for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        return f'{line} {extras}' if extras else line
+
+
+def configure_logging(app):
+    """Route all logging to stderr at LOG_LEVEL; leaves handlers a server already installed"""
+    root = logging.getLogger()
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if app.config.get('LOG_FORMAT') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter('[%(asctime)s] %(levelname)s in %(name)s: %(message)s'))
+    root.addHandler(handler)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _normalize_sql(statement):
+    """One line, bound values already parameterized; good enough to spot repeats"""
+    return re.sub(r'\s+', ' ', statement).strip()[:300]
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()        # (route, method, status) -> count
+        self.latency = {}                # (route, method) -> Histogram of seconds
+        self.queries = {}                # route -> Histogram of statements per request
+        self.sql_seconds = Counter()     # route -> total seconds in SQL
+        self.slow_queries = Counter()    # route -> statements over SLOW_QUERY_MS
+        self.budget_exceeded = Counter()  # route -> requests over QUERY_BUDGET or repeating a statement
+        self.recent_slow = deque(maxlen=50)
+        self.collectors = {}             # prefix -> callable returning {name: number}
+        self.slow_query_seconds = 0.1
+        self.query_budget = 20
+        self.repeat_limit = 10
+
+    def add_collector(self, prefix, collect):
+        """Export the numbers collect() returns as <prefix>_<name> gauges"""
+        self.collectors[prefix] = collect
+
+    def observe_request(self, route, method, status, seconds, statements, sql_seconds):
+        with self._lock:
+            self.requests[route, method, status] += 1
+            self.latency.setdefault((route, method), Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(route, Histogram(QUERY_COUNT_BUCKETS)).observe(statements)
+            self.sql_seconds[route] += sql_seconds
+
+    def observe_slow_query(self, route, statement, seconds):
+        with self._lock:
+            self.slow_queries[route] += 1
+            self.recent_slow.append({'route': route, 'seconds': round(seconds, 4),
+                                     'statement': _normalize_sql(statement), 'at': time.time()})
+
+    def observe_budget_exceeded(self, route):
+        with self._lock:
+            self.budget_exceeded[route] += 1
+
+    def render(self):
+        """Everything in Prometheus text exposition format"""
+        with self._lock:
+            lines = ['# HELP kids_app_requests_total Requests by route, method and status',
+                     '# TYPE kids_app_requests_total counter']
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'kids_app_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {count}')
+
+            lines += ['# HELP kids_app_request_seconds Request latency',
+                      '# TYPE kids_app_request_seconds histogram']
+            for (route, method), histogram in sorted(self.latency.items()):
+                lines += histogram.lines('kids_app_request_seconds', f'route="{_escape(route)}",method="{method}"')
+
+            lines += ['# HELP kids_app_sql_statements SQL statements per request',
+                      '# TYPE kids_app_sql_statements histogram']
+            for route, histogram in sorted(self.queries.items()):
+                lines += histogram.lines('kids_app_sql_statements', f'route="{_escape(route)}"')
+
+            for name, help_text, counter in (
+                ('kids_app_sql_seconds_total', 'Time spent in SQL', self.sql_seconds),
+                ('kids_app_slow_queries_total', 'Statements slower than SLOW_QUERY_MS', self.slow_queries),
+                ('kids_app_query_budget_exceeded_total', 'Requests over the query budget or repeating a statement',
+                 self.budget_exceeded),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{route="{_escape(route)}"}} {value:g}' for route, value in sorted(counter.items())]
+
+        for prefix, collect in self.collectors.items():
+            for name, value in sorted(collect().items()):
+                lines += [f'# TYPE kids_app_{prefix}_{name} gauge', f'kids_app_{prefix}_{name} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a failed statement leaves nothing behind
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    route = None
+    if has_request_context():
+        route = _route()
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+        g.setdefault('sql_repeats', Counter())[statement] += 1
+    if elapsed >= metrics.slow_query_seconds:
+        metrics.observe_slow_query(route or 'background', statement, elapsed)
+        logger.warning('Slow query', extra={'route': route, 'ms': round(elapsed * 1000, 1),
+                                            'statement': _normalize_sql(statement)})
+
+
+def init_metrics(app):
+    """Time requests and SQL for the app's engine; call after init_database()"""
+    metrics.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 100) / 1000
+    metrics.query_budget = app.config.get('QUERY_BUDGET', 20)
+    metrics.repeat_limit = app.config.get('N_PLUS_ONE_REPEATS', 10)
+
+    with app.app_context():
+        engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        route = _route()
+        statements = g.get('sql_statements', 0)
+        metrics.observe_request(route, request.method, response.status_code,
+                                time.perf_counter() - started, statements, g.get('sql_seconds', 0.0))
+
+        repeats = g.get('sql_repeats')
+        statement, times = repeats.most_common(1)[0] if repeats else ('', 0)
+        if statements > metrics.query_budget or times >= metrics.repeat_limit:
+            metrics.observe_budget_exceeded(route)
+            logger.warning('Possible N+1 queries', extra={
+                'route': route, 'statements': statements, 'budget': metrics.query_budget,
+                'repeated': times, 'statement': _normalize_sql(statement),
+            })
+        return response
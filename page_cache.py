@@ -0,0 +1,118 @@
+"""Pre-rendered pages for the activity screens.
+
+alphabet, numbers, drawing, math, activities, careers and home render
+large templates whose output never changes for a given template, content
+and the few session values they depend on. render_page() renders each
+variant once and keeps the HTML, its gzip form and an ETag in a
+process-wide LRU bounded by PAGE_CACHE_MAX_BYTES. A repeat visit costs a
+dict lookup, and a revalidating browser gets a bodyless 304.
+
+Views still run their own login check before calling render_page(), so
+a cached page is never served to someone who should be redirected.
+The cache is off in debug mode, where templates are edited live.
+
+init_page_cache() also gives Jinja a FileSystemBytecodeCache under
+JINJA_CACHE_DIR, so a fresh worker loads compiled templates instead of
+parsing them.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import request, session, render_template, make_response
+from jinja2 import FileSystemBytecodeCache
+
+CachedPage = namedtuple('CachedPage', 'body gzipped etag')
+
+
+class PageCache:
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._pages = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', self.max_bytes)
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', not app.debug)
+        self.clear()
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.stats['misses'] += 1
+                return None
+            self._pages.move_to_end(key)
+            self.stats['hits'] += 1
+            return page
+
+    def set(self, key, html):
+        body = html.encode('utf-8')
+        page = CachedPage(body, gzip.compress(body, 6), hashlib.blake2b(body, digest_size=12).hexdigest())
+        size = len(page.body) + len(page.gzipped)
+        if size > self.max_bytes:
+            return page
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._size -= len(old.body) + len(old.gzipped)
+            self._pages[key] = page
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self._size -= len(evicted.body) + len(evicted.gzipped)
+                self.stats['evictions'] += 1
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._size = 0
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._pages), bytes=self._size)
+
+
+page_cache = PageCache()
+
+
+def render_page(template, vary=(), key=(), **context):
+    """render_template() for pages that only depend on template, key and session[vary].
+
+    key holds anything else the output depends on (e.g. the careers list);
+    it must be hashable. Returns a response with ETag/304 and gzip support.
+    """
+    if not page_cache.enabled:
+        return render_template(template, **context)
+
+    cache_key = (template, tuple(session.get(name) for name in vary), key)
+    page = page_cache.get(cache_key)
+    if page is None:
+        page = page_cache.set(cache_key, render_template(template, **context))
+
+    if request.if_none_match.contains(page.etag):
+        response = make_response('', 304)
+    elif request.accept_encodings['gzip']:
+        response = make_response(page.gzipped)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(page.body)
+    response.set_etag(page.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'  # revalidate: the login check must still run
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_page_cache(app):
+    """Set up page_cache and Jinja's bytecode cache; call before anything renders a template"""
+    page_cache.init_app(app)
+    cache_dir = app.config.setdefault('JINJA_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(cache_dir))
@@ -0,0 +1,146 @@
+"""Password hashing off the request thread.
+
+scrypt/PBKDF2 take ~100 ms of CPU per call by design. Run inline, a burst
+of logins holds the GIL and stalls every other request on the worker.
+PasswordHasher can run them in a small process pool instead, so logins
+use every core and the request threads stay free. The pool is off by
+default (PASSWORD_HASH_WORKERS = 0 hashes inline); production turns it on
+with the PASSWORD_HASH_WORKERS environment variable, e.g. the number of
+cores. Its workers are spawned and re-import the main module, so a script
+that builds the app at import time must do so under
+`if __name__ == '__main__':` before enabling the pool.
+
+The pool is bounded: at most PASSWORD_HASH_MAX_PENDING calls may be
+running or queued. Beyond that a call fails fast with HasherBusy rather
+than piling up behind a queue that will time out anyway. A call that
+times out is cancelled if it has not started, and keeps its slot until
+the pool is really done with it.
+
+Hashes made with an older PASSWORD_HASH_METHOD are upgraded on the next
+successful login: verify() returns the new hash for the caller to store.
+"""
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """Too many hashes in flight; the caller should ask the user to retry"""
+
+
+def _timed_hash(password, method):
+    started = time.perf_counter()
+    return generate_password_hash(password, method), time.perf_counter() - started
+
+
+def _timed_check(stored_hash, password):
+    started = time.perf_counter()
+    return check_password_hash(stored_hash, password), time.perf_counter() - started
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 0          # 0: hash inline on the request thread
+        self.max_pending = 0
+        self.timeout = 10
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = None
+        self._method_prefix = None
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'hash_calls': 0, 'verify_calls': 0, 'rehashes': 0, 'rejected': 0,
+            'cpu_seconds': 0.0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+        }
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.workers * 8)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending) if self.workers else None
+        self._method_prefix = None
+        atexit.register(self.shutdown)
+
+    def _pool(self):
+        # Created on first use, so the pool is never inherited across a fork of the server
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _run(self, kind, fn, *args):
+        started = time.perf_counter()
+        if not self.workers:
+            result, cpu = fn(*args)
+        else:
+            if not self._slots.acquire(blocking=False):
+                self._record(rejected=1)
+                raise HasherBusy(f'{self.max_pending} password hashes already pending')
+            try:
+                future = self._pool().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot is held until the work itself is done, not just until we stop waiting for it
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                result, cpu = future.result(timeout=self.timeout)
+            except FutureTimeout:  # not the builtin TimeoutError before Python 3.11
+                future.cancel()  # still queued: never start it; already running: its slot frees when it ends
+                self._record(rejected=1)
+                raise HasherBusy(f'password {kind} took longer than {self.timeout}s')
+
+        elapsed = time.perf_counter() - started
+        self._record(**{f'{kind}_calls': 1}, cpu_seconds=cpu, wait_seconds=elapsed - cpu)
+        logger.debug('password %s took %.1f ms (%.1f ms waiting)', kind, elapsed * 1000, (elapsed - cpu) * 1000)
+        return result
+
+    def _record(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+            if 'wait_seconds' in increments:
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], increments['wait_seconds'])
+
+    def hash(self, password):
+        """A new hash of password with the configured method"""
+        return self._run('hash', _timed_hash, password, self.method)
+
+    def needs_rehash(self, stored_hash):
+        """True if stored_hash was made with a different method or cost"""
+        if self._method_prefix is None:
+            # werkzeug fills in default costs ('scrypt' -> 'scrypt:32768:8:1'); learn them once
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._method_prefix
+
+    def verify(self, stored_hash, password):
+        """(matches, new_hash); new_hash is set when the caller should store an upgraded hash"""
+        if not self._run('verify', _timed_check, stored_hash, password):
+            return False, None
+        if not self.needs_rehash(stored_hash):
+            return True, None
+        self._record(rehashes=1)
+        return True, self.hash(password)
+
+    def metrics(self):
+        with self._stats_lock:
+            return dict(self.stats, workers=self.workers, max_pending=self.max_pending)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,184 @@
+"""Opt-in per-request profiling for production.
+
+A request is profiled when any of these match:
+
+- a random PROFILE_SAMPLE_RATE fraction of all requests (0 by default)
+- the logged-in user is in PROFILE_USER_IDS
+- it carries an `X-Profile: <PROFILE_TOKEN>` header
+
+The profile covers the whole view, template rendering included. A
+streamed response (history exports, the live coin stream) is only
+profiled until the view returns its generator; the rows or events
+written afterwards are not in it. It is saved under PROFILE_DIR with a
+small JSON sidecar (route, user, timing). Only the newest PROFILE_KEEP
+profiles are kept, so the directory stays bounded however long sampling
+is left on. pyinstrument is used when installed (HTML output); otherwise
+cProfile (pstats dumps). A view that raises is not saved, but its
+profiler is always stopped.
+"""
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import re
+import time
+
+from flask import g, request, session
+
+try:
+    import pyinstrument
+except ImportError:  # optional; cProfile is always available
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME = re.compile(r'^\d+-[\w.-]+\.(prof|html)$')
+
+
+class ProfileStore:
+    def __init__(self, directory, keep=50):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, route, data, extension, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^\w.-]+', '_', route).strip('_') or 'root'
+        name = f'{time.time_ns()}-{slug}.{extension}'
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump(dict(meta, name=name), f)
+        self._trim()
+        return name
+
+    def _names(self):
+        try:
+            return sorted((n for n in os.listdir(self.directory) if PROFILE_NAME.match(n)), reverse=True)
+        except FileNotFoundError:
+            return []
+
+    def _trim(self):
+        for name in self._names()[self.keep:]:
+            for path in (name, name + '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, path))
+                except FileNotFoundError:
+                    pass  # another worker trimmed it first
+
+    def list(self):
+        """Metadata of the kept profiles, newest first"""
+        entries = []
+        for name in self._names():
+            try:
+                with open(os.path.join(self.directory, name + '.json')) as f:
+                    entries.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                entries.append({'name': name})
+        return entries
+
+    def read(self, name):
+        """(body, mimetype) for display, or None for unknown names"""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        if name.endswith('.html'):
+            with open(path, 'rb') as f:
+                return f.read(), 'text/html'
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(60)
+        return out.getvalue(), 'text/plain'
+
+
+class _CProfileRun:
+    extension = 'prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def finish(self):
+        self.stop()
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)  # what dump_stats() writes; pstats reads it back
+
+
+class _PyinstrumentRun:
+    extension = 'html'
+
+    def __init__(self):
+        self.profiler = pyinstrument.Profiler(async_mode='disabled')
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def finish(self):
+        self.stop()
+        return self.profiler.output_html().encode()
+
+
+def _wants_profile(app):
+    if request.endpoint == 'static':
+        return None  # nothing to learn, and reading the session would add Vary: Cookie
+    token = app.config['PROFILE_TOKEN']
+    if token and request.headers.get('X-Profile') == token:
+        return 'header'
+    if session.get('user_id') in app.config['PROFILE_USER_IDS']:
+        return 'user'
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def init_profiling(app):
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_USER_IDS', ())
+    app.config.setdefault('PROFILE_TOKEN', app.config.get('ADMIN_TOKEN'))
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('PROFILE_KEEP', 50)
+    app.config.setdefault('PROFILER', 'pyinstrument' if pyinstrument else 'cprofile')
+    store = app.extensions['profiles'] = ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'])
+    run_class = _PyinstrumentRun if app.config['PROFILER'] == 'pyinstrument' and pyinstrument else _CProfileRun
+
+    @app.before_request
+    def start_profile():
+        reason = _wants_profile(app)
+        if reason:
+            g.profile = (run_class(), reason, time.perf_counter())
+
+    @app.after_request
+    def save_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        run, reason, started = profile
+        data = run.finish()
+        route = request.url_rule.rule if request.url_rule else request.path
+        try:
+            name = store.save(route, data, run.extension, {
+                'route': route, 'method': request.method, 'status': response.status_code,
+                'user_id': session.get('user_id'), 'reason': reason,
+                'ms': round((time.perf_counter() - started) * 1000, 1), 'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+            response.headers['X-Profile-Id'] = name
+        except OSError:
+            logger.exception('Could not save profile for %s', route)
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        # after_request never ran (the view raised, or another hook did): stop the profiler so it does
+        # not stay installed on this thread and break the next profiled request
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile[0].stop()
@@ -0,0 +1,221 @@
+"""Geometric similarity between a shape builder canvas and its target.
+
+Shapes arrive as the strings shape.js sends ("48% 21%", "60px",
+"15deg"). They are parsed once into NumPy arrays, every user shape is
+compared with every target shape in one vectorized pass, and the best
+one-to-one pairing is found with the Hungarian algorithm. A canvas with
+hundreds of shapes against a typical 2-5 shape target scores in well
+under a millisecond.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+# scipy's solver is imported on first use; scipy.optimize alone adds ~0.4 s to startup
+_UNRESOLVED = object()
+linear_sum_assignment = _UNRESOLVED
+
+# How much each aspect of a matched pair counts towards its score
+POSITION_WEIGHT = 0.6
+SIZE_WEIGHT = 0.25
+ROTATION_WEIGHT = 0.15
+
+# Rotations that leave a shape looking the same, in degrees, by type code
+ROTATIONAL_SYMMETRY = np.array([1.0, 90.0, 360.0, 180.0, 360.0])  # circle, square, triangle, rectangle, unknown
+
+# Cost for pairing shapes of different types; never part of a real match
+MISMATCH_COST = 1e6
+
+
+# Small integer codes so type comparisons stay inside NumPy
+TYPE_CODES = {'circle': 0, 'square': 1, 'triangle': 2, 'rectangle': 3}
+UNKNOWN_TYPE = -1
+
+
+class ShapeArrays(NamedTuple):
+    types: np.ndarray      # (n,) TYPE_CODES value per shape
+    xy: np.ndarray         # (n, 2) centre in % of the canvas
+    size: np.ndarray       # (n,) mean size in px
+    rotation: np.ndarray   # (n,) degrees in [0, 360)
+
+
+def _numbers(value, unit, default):
+    """'30px 60px', 30 or ['30px', 60] -> [30.0, 60.0]; None when unparseable"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, dict):
+        value = [value.get('x', default[0]), value.get('y', default[-1])]
+    elif not isinstance(value, (list, tuple)):
+        value = str(value).split()
+    try:
+        return [float(str(part).strip().rstrip(unit)) for part in value] or None
+    except (TypeError, ValueError):
+        return None
+
+
+def _column(values, unit, width):
+    """Parse equally shaped strings like '48% 21%' in one pass; ValueError if any differ"""
+    numbers = np.array(' '.join(values).replace(unit, ' ').split(), dtype=float)
+    if numbers.size != len(values) * width:
+        raise ValueError('irregular values')
+    return numbers.reshape(len(values), width)
+
+
+def _type_code(shape):
+    kind = shape.get('type') if isinstance(shape, dict) else None
+    return TYPE_CODES.get(kind, UNKNOWN_TYPE) if isinstance(kind, str) else UNKNOWN_TYPE
+
+
+def _parse_fast(shapes):
+    xy = _column([shape['position'] for shape in shapes], '%', 2)
+    size = _column([shape['size'] for shape in shapes], 'px', 1)[:, 0]
+    rotation = _column([shape.get('rotation') or '0deg' for shape in shapes], 'deg', 1)[:, 0]
+    return xy, size, rotation
+
+
+def _parse_slow(shapes):
+    n = len(shapes)
+    xy = np.zeros((n, 2))
+    size = np.zeros(n)
+    rotation = np.zeros(n)
+    for i, shape in enumerate(shapes):
+        if not isinstance(shape, dict):
+            xy[i] = np.nan  # not a shape at all; scores zero like any other unreadable one
+            continue
+        position = _numbers(shape.get('position'), '%', [50.0, 50.0])
+        dims = _numbers(shape.get('size'), 'px', [60.0])
+        turn = _numbers(shape.get('rotation'), 'deg', [0.0])
+        if position is None or dims is None or turn is None:
+            xy[i] = np.nan
+            continue
+        xy[i] = position[:2] if len(position) >= 2 else position * 2
+        size[i] = sum(dims) / len(dims)
+        rotation[i] = turn[0]
+    return xy, size, rotation
+
+
+def parse_shapes(shapes):
+    """Turn a list of shape dicts into ShapeArrays.
+
+    A shape whose position, size or rotation is unreadable or not finite
+    ("nan% 20%", "1e999px") gets UNKNOWN_TYPE, so it never matches a
+    target and scores zero, like a shape of the wrong type.
+    """
+    types = np.fromiter((_type_code(shape) for shape in shapes), dtype=np.int8, count=len(shapes))
+    try:
+        # What shape.js sends: every shape has "x% y%", "Npx" and "Ndeg" strings
+        xy, size, rotation = _parse_fast(shapes)
+    except (KeyError, TypeError, AttributeError, ValueError):
+        # Hand-written content such as "30px 60px" sizes or missing fields
+        xy, size, rotation = _parse_slow(shapes)
+    finite = np.isfinite(xy).all(axis=1) & np.isfinite(size) & np.isfinite(rotation)
+    if not finite.all():
+        types[~finite] = UNKNOWN_TYPE
+        xy[~finite], size[~finite], rotation[~finite] = 0.0, 0.0, 0.0
+    return ShapeArrays(types, xy, size, np.mod(rotation, 360.0))
+
+
+def pair_scores(user, target, position_tolerance):
+    """(targets, user shapes) matrix of 0-1 scores, or -1 where types differ"""
+    same_type = (target.types[:, None] == user.types[None, :]) & (target.types[:, None] != UNKNOWN_TYPE)
+
+    # Full marks within the tolerance, falling to zero at three times it
+    tolerance = max(float(position_tolerance), 1.0)
+    distance = np.linalg.norm(target.xy[:, None, :] - user.xy[None, :, :], axis=2)
+    position = np.clip(1.0 - (distance - tolerance) / (2.0 * tolerance), 0.0, 1.0)
+
+    big = np.maximum(target.size[:, None], user.size[None, :])
+    small = np.minimum(target.size[:, None], user.size[None, :])
+    size = np.divide(small, big, out=np.ones_like(big), where=big > 0)
+
+    period = ROTATIONAL_SYMMETRY[target.types][:, None]
+    turn = np.mod(user.rotation[None, :] - target.rotation[:, None], period)
+    turn = np.minimum(turn, period - turn)
+    rotation = 1.0 - turn / (period / 2.0)
+    rotation[period[:, 0] == 1.0] = 1.0  # circles look the same at any angle
+
+    scores = POSITION_WEIGHT * position + SIZE_WEIGHT * size + ROTATION_WEIGHT * rotation
+    return np.where(same_type, scores, -1.0)
+
+
+def _hungarian(cost):
+    """Min-cost assignment of every row to a distinct column (rows <= columns).
+
+    Shortest augmenting path with potentials; the inner loop over columns
+    is vectorized, so the Python work is O(rows^2).
+    """
+    rows, cols = cost.shape
+    u = np.zeros(rows + 1)
+    v = np.zeros(cols + 1)
+    match = np.zeros(cols + 1, dtype=int)   # match[j] = 1-based row assigned to column j
+    way = np.zeros(cols + 1, dtype=int)
+
+    for i in range(1, rows + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(cols + 1, np.inf)
+        used = np.zeros(cols + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    assigned = np.nonzero(match[1:])[0]
+    return match[1:][assigned] - 1, assigned
+
+
+def scipy_solver():
+    """scipy's linear_sum_assignment, or None when scipy is not installed"""
+    global linear_sum_assignment
+    if linear_sum_assignment is _UNRESOLVED:
+        try:
+            from scipy.optimize import linear_sum_assignment as solver
+        except ImportError:  # scipy is optional; the NumPy solver below is used instead
+            solver = None
+        linear_sum_assignment = solver
+    return linear_sum_assignment
+
+
+def best_assignment(scores):
+    """Row and column indices of the one-to-one pairing with the highest total score"""
+    cost = np.where(scores < 0, MISMATCH_COST, 1.0 - scores)
+    if scores.shape[0] > scores.shape[1]:
+        cols, rows = best_assignment(scores.T)
+        return rows, cols
+    solver = scipy_solver()
+    if solver is not None:
+        return solver(cost)
+    return _hungarian(cost)
+
+
+def similarity(user_shapes, target, position_tolerance):
+    """0-100 score for user_shapes (list of dicts) against target ShapeArrays"""
+    if not user_shapes or not len(target.types):
+        return 0
+    user = parse_shapes(user_shapes)
+    scores = pair_scores(user, target, position_tolerance)
+    rows, cols = best_assignment(scores)
+    matched = scores[rows, cols]
+    total = matched[matched >= 0].sum()
+
+    # Each target shape is worth the same; extra shapes cost a little
+    n_target, n_user = len(target.types), len(user.types)
+    extra = max(n_user - n_target, 0)
+    return int(round(100 * total / (n_target + 0.5 * extra)))
@@ -23,12 +23,10 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Load colors from API
-    async function loadColors() {
+    // Load the colors the page was rendered with
+    function loadColors() {
         try {
-            const response = await fetch('/api/colors');
-            if (!response.ok) throw new Error('Failed to load colors');
-            colors = await response.json();
+            colors = JSON.parse(document.getElementById('carnivalColors').textContent);
             renderColors();
         } catch (error) {
             console.error('Error loading colors:', error);
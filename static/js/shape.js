@@ -12,28 +12,43 @@ class ShapeBuilderGame {
     }
     
     async init() {
-        const isLoggedIn = await this.checkAuth();
-        if (isLoggedIn) {
-            this.loadUserStats();
-            this.loadNewTask();
+        const bootstrap = await this.loadBootstrap();
+        if (bootstrap) {
+            this.showStats(bootstrap.stats);
+            if (bootstrap.current_task) {
+                this.showTask(bootstrap.current_task);  // resume the unsolved task
+            } else {
+                this.loadNewTask();
+            }
             this.setupEventListeners();
             this.setupDragAndDrop();
+            if (bootstrap.live_updates) this.listenForCoins();
         }
     }
     
-    async checkAuth() {
+    // Balance changes from other tabs and games arrive over Server-Sent Events
+    listenForCoins() {
+        if (!window.EventSource) return;
+        const source = new EventSource('/api/coins/stream');
+        source.addEventListener('balance', (event) => {
+            this.showStats({ coins: JSON.parse(event.data).coins });
+        });
+    }
+    
+    // Coins, counts and the current task in one request; also our login check
+    async loadBootstrap() {
         try {
-            const response = await fetch('/api/user_stats');
+            const response = await fetch('/api/bootstrap');
             if (response.ok) {
-                return true;
+                return await response.json();
             } else {
                 window.location.href = '/login';
-                return false;
+                return null;
             }
         } catch (error) {
             console.error('Auth check failed:', error);
             window.location.href = '/login';
-            return false;
+            return null;
         }
     }
     
@@ -451,25 +466,27 @@ class ShapeBuilderGame {
                 }
                 throw new Error('Failed to load task');
             }
-            const task = await response.json();
-            
-            this.currentTask = task;
-            this.updateTaskDisplay(task);
-            
-            // Clear canvas for new task
-            this.clearCanvas();
-            
-            // Hide next button, show done button
-            document.getElementById('next-btn').style.display = 'none';
-            document.getElementById('done-btn').style.display = 'flex';
-            
-            this.showNotification(`New task: ${task.name}!`, 'success');
+            this.showTask(await response.json());
         } catch (error) {
             console.error('Error loading task:', error);
             this.showNotification('Failed to load task', 'error');
         }
     }
     
+    showTask(task) {
+        this.currentTask = task;
+        this.updateTaskDisplay(task);
+        
+        // Clear canvas for new task
+        this.clearCanvas();
+        
+        // Hide next button, show done button
+        document.getElementById('next-btn').style.display = 'none';
+        document.getElementById('done-btn').style.display = 'flex';
+        
+        this.showNotification(`New task: ${task.name}!`, 'success');
+    }
+    
     updateTaskDisplay(task) {
         document.getElementById('task-name').textContent = task.name;
         document.getElementById('task-description').textContent = task.description;
@@ -546,8 +563,8 @@ class ShapeBuilderGame {
                     'success'
                 );
 
-                // Update coin display
-                await this.loadUserStats();
+                // Update coin display from the stats returned with the result
+                this.showStats(result.stats);
 
                 // Show next button
                 document.getElementById('next-btn').style.display = 'flex';
@@ -561,22 +578,8 @@ class ShapeBuilderGame {
         }
     }
     
-    async loadUserStats() {
-        try {
-            const response = await fetch('/api/user_stats');
-            if (!response.ok) {
-                if (response.status === 401) {
-                    window.location.href = '/login';
-                    return;
-                }
-                throw new Error('Failed to load stats');
-            }
-            const stats = await response.json();
-            
-            document.getElementById('coin-count').textContent = stats.coins;
-        } catch (error) {
-            console.error('Error loading stats:', error);
-        }
+    showStats(stats) {
+        document.getElementById('coin-count').textContent = stats.coins;
     }
     
     showNotification(message, type) {
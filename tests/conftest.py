@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+
+PASSWORD = 'Secret123'
+
+
+@pytest.fixture
+def app_config():
+    """Extra create_app() config; override in a test module to change it"""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PASSWORD_HASH_WORKERS': 0,
+        'JINJA_CACHE_DIR': None,
+        'LOG_LEVEL': 'ERROR',
+        **app_config,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='kid', email='kid@example.com', phone='5550000001', gender='girl',
+                            age='6-8', password_hash=generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000')))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as user 1"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
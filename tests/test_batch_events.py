@@ -0,0 +1,30 @@
+def test_non_object_body_is_rejected(client):
+    for body in ([1], [], 'x', 3):
+        response = client.post('/api/events/batch', json=body)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'events must be a list'
+
+
+def test_unhashable_type_rejects_only_that_event(client):
+    response = client.post('/api/events/batch', json={'events': [
+        {'type': [1]},
+        {'key': 'bad-type', 'type': [1]},
+        {'key': 'dict-type', 'type': {'a': 1}},
+        {'key': 'good', 'type': 'math', 'level': 1, 'score': 5, 'coins_earned': 3},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    rejected = {item['key'] for item in body['rejected']}
+    assert {None, 'bad-type', 'dict-type'} <= rejected
+    assert 'good' not in rejected
+    assert body['total_coins'] == 3
+
+
+def test_malformed_events_do_not_fail_the_batch(client):
+    response = client.post('/api/events/batch', json={'events': [
+        {'key': 'attempt', 'type': 'quiz', 'attempt': ['x'], 'answers': []},
+        {'key': 'level', 'type': 'math', 'level': 9, 'score': 1, 'coins_earned': 1},
+        {'key': 'coins', 'type': 'math', 'level': 1, 'score': 1, 'coins_earned': 10 ** 20},
+    ]})
+    assert response.status_code == 200
+    assert {item['key'] for item in response.get_json()['rejected']} == {'attempt', 'level', 'coins'}
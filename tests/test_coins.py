@@ -0,0 +1,47 @@
+import threading
+
+from sqlalchemy import func
+
+from models import db, Coins, CoinLedger, award_coins, award_coins_by_activity
+
+THREADS = 8
+AWARDS = 25
+
+
+def test_zero_award_writes_no_ledger_row(app):
+    with app.app_context():
+        assert award_coins(1, 0, 'quiz') == 0
+        assert award_coins_by_activity(1, {'quiz': 0, 'math': 3}) == 3
+        db.session.commit()
+        assert db.session.query(CoinLedger.activity, CoinLedger.amount).all() == [('math', 3)]
+        assert db.session.get(Coins, 1).coins == 3
+
+
+def test_concurrent_awards_keep_ledger_and_balance_equal(app):
+    start = threading.Barrier(THREADS)
+    errors = []
+
+    def award(amount):
+        with app.app_context():
+            start.wait()
+            try:
+                for _ in range(AWARDS):
+                    award_coins(1, amount, 'math')
+                    db.session.commit()
+            except Exception as exc:  # surfaced by the assertion below
+                errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=award, args=(i % 3,)) for i in range(THREADS)]  # amounts 0, 1, 2
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    expected = sum(i % 3 for i in range(THREADS)) * AWARDS
+    with app.app_context():
+        assert db.session.get(Coins, 1).coins == expected
+        assert db.session.query(func.sum(CoinLedger.amount)).scalar() == expected
+        assert db.session.query(CoinLedger).filter(CoinLedger.amount == 0).count() == 0
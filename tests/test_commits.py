@@ -0,0 +1,62 @@
+"""Every write route is one unit of work: exactly one commit per request"""
+import pytest
+
+
+def commits(response):
+    return response.headers['X-DB-Commits']
+
+
+def test_signin(app):
+    response = app.test_client().post('/signin', data={
+        'username': 'new', 'email': 'new@example.com', 'phone': '5550000002',
+        'gender': 'boy', 'age': '6-8', 'password': 'Secret123',
+    })
+    assert response.status_code == 302
+    assert commits(response) == '1'
+
+
+def test_profile(client):
+    response = client.post('/profile', data={
+        'username': 'kid', 'email': 'kid@example.com', 'phone': '5550000001', 'age': '9-12',
+    })
+    assert response.status_code == 302
+    assert commits(response) == '1'
+
+
+def test_quiz(app, client):
+    category = next(iter(app.extensions['content'].current().questions_by_category))
+    response = client.post('/quiz', data={'category': category})
+    assert response.status_code == 200
+    assert commits(response) == '1'
+
+    response = client.post('/quiz', data={f'q{i}': 'blue' for i in range(5)})
+    assert response.status_code == 302
+    assert commits(response) == '1'
+
+
+def test_shape_task_and_validation(client):
+    response = client.get('/api/get_task')
+    assert response.status_code == 200
+    assert commits(response) == '1'
+
+    task = response.get_json()
+    response = client.post('/api/validate_shape', json={'task_id': task['id'], 'shapes': task['target_shapes']})
+    assert response.get_json()['valid']
+    assert commits(response) == '1'
+
+
+@pytest.mark.parametrize('route, body', [
+    ('/api/math/complete', {'level': 2, 'score': 7, 'coins_earned': 3}),
+    ('/api/events/batch', {'events': [{'key': 'k1', 'type': 'math', 'level': 1, 'score': 5, 'coins_earned': 3}]}),
+])
+def test_json_writes(client, route, body):
+    response = client.post(route, json=body)
+    assert response.status_code == 200
+    assert commits(response) == '1'
+
+
+def test_carnival_spin(app, client):
+    color = app.extensions['content'].current().colors[0]
+    response = client.post('/api/colour_carnival/spin', json={'color': color.name, 'code': color.code})
+    assert response.status_code == 200
+    assert commits(response) == '1'
@@ -0,0 +1,24 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {'PROFILER': 'cprofile', 'PROFILE_USER_IDS': (1,), 'PROFILE_DIR': str(tmp_path / 'profiles')}
+
+
+def test_profiler_is_stopped_when_the_view_raises(app, client):
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        client.get('/boom')  # TESTING propagates the exception, so after_request never runs
+    assert sys.getprofile() is None
+
+    response = client.get('/api/bootstrap')
+    assert response.status_code == 200
+    assert response.headers['X-Profile-Id'].endswith('.prof')
+    assert len(app.extensions['profiles'].list()) == 1
+    assert sys.getprofile() is None
@@ -0,0 +1,24 @@
+import pytest
+
+from app import hot_queries, query_plans, uses_index
+
+
+def test_every_hot_query_uses_an_index(app):
+    with app.app_context():
+        plans = query_plans()
+        assert set(plans) == set(hot_queries())
+    for route, plan in plans.items():
+        assert uses_index(plan), f"{route}: {' | '.join(plan)}"
+        assert any('USING INDEX' in step or 'USING COVERING INDEX' in step or 'PRIMARY KEY' in step
+                   for step in plan), f"{route}: {' | '.join(plan)}"
+
+
+@pytest.mark.parametrize('plan, ok', [
+    (['SEARCH coins USING INDEX ix_coins_user_id (user_id=?)'], True),
+    (['SEARCH quiz_result USING COVERING INDEX ix_quiz_result_user_id_date_taken (user_id=?)'], True),
+    (['SCAN quiz_result'], False),
+    (['SCAN quiz_result USING INDEX ix_quiz_result_date_taken'], False),  # walks the whole index
+    (['SEARCH user USING INDEX ix_user_phone (phone=?)', 'USE TEMP B-TREE FOR ORDER BY'], True),
+])
+def test_uses_index(plan, ok):
+    assert uses_index(plan) is ok